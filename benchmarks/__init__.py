@@ -0,0 +1 @@
+"""Offline benchmarks (not shipped with the package)."""
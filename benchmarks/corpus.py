@@ -0,0 +1,147 @@
+"""Synthetic article corpora shaped like the crawled ones."""
+
+
+import datetime
+import string
+
+import numpy as np
+
+from truestory.models import ArticleModel
+from truestory.models.base import ndb, ndb_kwargs
+
+
+SIDES = sorted(ArticleModel.SIDE_MAPPING.values())
+VOCABULARY_SIZE = 50000
+SOURCES_COUNT = 400
+KEYWORDS_PER_ARTICLE = (6, 20)  # inclusive ranges
+WORDS_PER_ARTICLE = (80, 400)
+ZIPF_EXPONENT = 1.1
+# Articles covering the same story share most of their keywords, while their
+# publishers write most of the content in their own words.
+STORY_SIZE = 8  # average articles per story
+STORY_KEYWORDS_RATIO = 0.7
+STORY_REWRITE_RATIO = 0.7
+
+
+class SyntheticArticle:
+
+    """Lightweight article having all the `ArticleModel` fields used by pairing.
+    """
+
+    __slots__ = (
+        "key", "source_name", "link", "title", "content", "summary", "authors",
+        "published", "image", "keywords", "side",
+    )
+
+    def __init__(self, **kwargs):
+        for field in self.__slots__:
+            setattr(self, field, kwargs.get(field))
+
+
+def _get_vocabulary(size):
+    """Returns `size` distinct lowercase words."""
+    words = []
+    for idx in range(size):
+        word = ""
+        idx += len(string.ascii_lowercase) ** 2  # at least three letters
+        while idx:
+            idx, rest = divmod(idx, len(string.ascii_lowercase))
+            word += string.ascii_lowercase[rest]
+        words.append(word)
+    return np.array(words)
+
+
+class _WordSampler:
+
+    """Picks words following a Zipf distribution over a fixed vocabulary."""
+
+    def __init__(self, vocabulary, random, keywords_ratio=STORY_KEYWORDS_RATIO,
+                 rewrite_ratio=STORY_REWRITE_RATIO):
+        self.vocabulary = vocabulary
+        self.random = random
+        self.keywords_ratio = keywords_ratio
+        self.rewrite_ratio = rewrite_ratio
+
+    def __call__(self, count):
+        ranks = self.random.zipf(ZIPF_EXPONENT, size=count)
+        return self.vocabulary[(ranks - 1) % len(self.vocabulary)].tolist()
+
+    def _count(self, bounds):
+        return self.random.randint(bounds[0], bounds[1] + 1)
+
+    def mix(self, story_words, bounds):
+        """Takes most of the (unique) words from the story and the rest from the
+        whole vocabulary.
+        """
+        count = self._count(bounds)
+        shared_count = min(int(count * self.keywords_ratio), len(story_words))
+        picked = self.random.choice(story_words, size=shared_count, replace=False)
+        return sorted(set(picked.tolist() + self(count - shared_count)))
+
+    def rewrite(self, story_words, bounds):
+        """Takes a passage of the story with some of its words replaced."""
+        count = min(self._count(bounds), len(story_words))
+        start = self.random.randint(len(story_words) - count + 1)
+        words = story_words[start:start + count]
+        replaced = np.flatnonzero(self.random.rand(count) < self.rewrite_ratio)
+        for idx, word in zip(replaced, self(len(replaced))):
+            words[idx] = word
+        return words
+
+
+def generate_corpus(size, seed=0, vocabulary_size=VOCABULARY_SIZE,
+                    sources_count=SOURCES_COUNT, keywords_ratio=STORY_KEYWORDS_RATIO,
+                    rewrite_ratio=STORY_REWRITE_RATIO):
+    """Generates `size` articles with Zipf distributed keywords and content, grouped
+    in stories covered by sources across all the sides.
+
+    Each article takes `keywords_ratio` of its keywords from the story, while
+    replacing `rewrite_ratio` of the story words within its content.
+
+    It has to be called within an NDB context, since every article gets its own key
+    (nothing is saved though).
+
+    Returns:
+        list: Of `SyntheticArticle` objects, the newest ones last.
+    """
+    random = np.random.RandomState(seed)
+    sample = _WordSampler(
+        _get_vocabulary(vocabulary_size), random, keywords_ratio=keywords_ratio,
+        rewrite_ratio=rewrite_ratio
+    )
+    sources = [
+        (f"Source{idx} - News", SIDES[idx % len(SIDES)])
+        for idx in range(sources_count)
+    ]
+    now = datetime.datetime.utcnow()
+
+    stories = {}
+    articles = []
+    for idx in range(size):
+        # Stories spread over the whole corpus, so the newest articles relate to
+        # older ones too.
+        story = random.randint(max(size // STORY_SIZE, 1))
+        if story not in stories:
+            stories[story] = (
+                sorted(set(sample(KEYWORDS_PER_ARTICLE[1]))),
+                sample(WORDS_PER_ARTICLE[1])
+            )
+        story_keywords, story_words = stories[story]
+
+        words = sample.rewrite(story_words, WORDS_PER_ARTICLE)
+        source_idx = random.randint(len(sources))
+        source_name, side = sources[source_idx]
+        articles.append(
+            SyntheticArticle(
+                key=ndb.Key(ArticleModel, idx + 1, **ndb_kwargs()),
+                source_name=source_name,
+                link=f"https://source{source_idx}.news/{idx}",
+                title=" ".join(words[:10]).capitalize(),
+                content=" ".join(words),
+                authors=[],
+                published=now - datetime.timedelta(minutes=size - idx),
+                keywords=sample.mix(story_keywords, KEYWORDS_PER_ARTICLE),
+                side=side,
+            )
+        )
+    return articles
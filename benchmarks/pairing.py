@@ -0,0 +1,268 @@
+"""Offline bias pairing benchmark.
+
+Indexes a synthetic corpus into an in-memory Redis replacement, then times the
+pairing task over a freshly crawled batch of articles against it, the same way the
+saved chunks are paired after a crawl. No remote service is used.
+
+The pairing stages are timed without tracing the allocations, which are traced
+within a separate run giving the peak memory only. The pairs found by the
+exhaustive keyword index retrieval are the reference for the recall of the LSH
+retrieval.
+
+Usage:
+    python -m benchmarks.pairing --sizes 1000 10000 100000 -o pairing.json
+"""
+
+
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+import numpy as np
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.corpus import (
+    STORY_KEYWORDS_RATIO, STORY_REWRITE_RATIO, generate_corpus
+)
+from benchmarks.storage import LocalDatastore, LocalRedis, local_pairing
+from truestory import settings
+from truestory.models import PreferencesModel
+from truestory.models.base import ndb, ndb_kwargs
+from truestory.models.index import KeywordIndex, LshIndex
+
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_BATCH = 100  # articles crawled at once
+INDEX_CHUNK = 1000  # articles indexed per pipeline
+LSH_BANDS = 64  # of 2 rows, when retrieving the candidates through LSH
+
+
+def _set_preferences(**options):
+    """Makes `PreferencesModel.cached` return local preferences during the run."""
+    settings.PREFERENCES_TTL = float("inf")
+    PreferencesModel._cached = PreferencesModel(**options)
+    PreferencesModel._cached_at = time.monotonic()
+
+
+class Timer:
+
+    """Measures the wall time of named stages, summed over all their calls."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def measure(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stage = self.stages.setdefault(name, {"seconds": 0.0})
+            stage["seconds"] = round(
+                stage["seconds"] + time.perf_counter() - start, 6
+            )
+
+    def wrap(self, name, func):
+        """Returns `func` measured as the `name` stage on every call."""
+        return lambda *args, **kwargs: self.measure(name, func, *args, **kwargs)
+
+
+def _measure_peak(func, *args, **kwargs):
+    """Returns the peak memory (MB) allocated while running `func`.
+
+    Tracing the allocations slows down everything, so it's never done while timing.
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 2 ** 20, 3)
+
+
+def _index_corpus(index, corpus):
+    for start in range(0, len(corpus), INDEX_CHUNK):
+        index.add_multi(corpus[start:start + INDEX_CHUNK])
+
+
+@contextlib.contextmanager
+def _timed_stages(article_tasks, timer, prefix=""):
+    """Measures each of the stages called by the pairing task with `timer`."""
+    stages = [
+        ("retrieval", article_tasks, "_lookup_candidates"),
+        ("idf", article_tasks, "_get_idf"),
+        ("pruning", article_tasks, "_drop_uninformative"),
+        ("loading", article_tasks.ArticleModel, "get_multi"),
+        ("scoring", article_tasks.algo, "score_pairs"),
+        ("score_storing", article_tasks.pair_scores, "add_multi"),
+        ("materialization", article_tasks.BiasPairModel, "from_articles"),
+        ("materialization", article_tasks.BiasPairModel, "put_multi"),
+    ]
+    with contextlib.ExitStack() as stack:
+        for name, target, attribute in stages:
+            timed = timer.wrap(prefix + name, getattr(target, attribute))
+            stack.enter_context(mock.patch.object(target, attribute, timed))
+        yield
+
+
+def _pair_batch(mains, corpus, client, lsh_bands, idf, timer=None, prefix=""):
+    """Pairs the `mains` in saving chunks through the pairing task, measuring its
+    stages with the given `timer`.
+
+    Returns:
+        LocalDatastore: Holding the saved bias pairs and the loaded articles count.
+    """
+    _set_preferences(idf_weighting=idf, lsh_bands=lsh_bands)
+    datastore = LocalDatastore(corpus)
+    with contextlib.ExitStack() as stack:
+        article_tasks = stack.enter_context(local_pairing(datastore, client))
+        if timer:
+            stack.enter_context(_timed_stages(article_tasks, timer, prefix=prefix))
+        chunk_size = article_tasks.SAVE_CHUNK_SIZE
+        for start in range(0, len(mains), chunk_size):
+            article_tasks._pair_articles(mains[start:start + chunk_size])
+    return datastore
+
+
+def run_benchmark(size, batch_size=DEFAULT_BATCH, lsh=True, idf=False, seed=0,
+                  keywords_ratio=STORY_KEYWORDS_RATIO,
+                  rewrite_ratio=STORY_REWRITE_RATIO):
+    """Runs the pairing task over a batch of the newest `batch_size` articles
+    against the rest of a synthetic corpus of `size` articles.
+
+    Returns:
+        dict: Timings (per stage too), memory, throughput, produced pairs count and
+            their recall against the keyword index retrieval.
+    """
+    timer = Timer()
+    corpus = timer.measure(
+        "corpus", generate_corpus, size, seed=seed, keywords_ratio=keywords_ratio,
+        rewrite_ratio=rewrite_ratio
+    )
+    mains = corpus[-batch_size:]
+
+    client = LocalRedis()
+    timer.measure("indexing", _index_corpus, KeywordIndex(client=client), corpus)
+    lsh_bands = LSH_BANDS if lsh else 0
+    if lsh:
+        _set_preferences(lsh_bands=lsh_bands)
+        timer.measure(
+            "lsh_indexing", _index_corpus, LshIndex(client=client), corpus
+        )
+
+    datastore = timer.measure(
+        "pairing", _pair_batch, mains, corpus, client, lsh_bands, idf, timer=timer
+    )
+    pairs = set(datastore.bias_pairs)
+    if lsh:
+        # Timed the same way, so the retrievals can be compared.
+        exact_pairs = set(timer.measure(
+            "exact_pairing", _pair_batch, mains, corpus, client, 0, idf,
+            timer=timer, prefix="exact_"
+        ).bias_pairs)
+    else:
+        exact_pairs = pairs
+    recall = len(pairs & exact_pairs) / len(exact_pairs) if exact_pairs else 1.0
+    peak_mb = _measure_peak(_pair_batch, mains, corpus, client, lsh_bands, idf)
+
+    pairing_seconds = timer.stages["pairing"]["seconds"]
+    return {
+        "size": size,
+        "batch": len(mains),
+        "lsh": lsh,
+        "idf": idf,
+        "keywords_ratio": keywords_ratio,
+        "rewrite_ratio": rewrite_ratio,
+        "candidates": datastore.loaded,
+        "pairs": len(pairs),
+        "exact_pairs": len(exact_pairs),
+        "recall": round(recall, 6),
+        "stages": timer.stages,
+        "pairing_seconds": pairing_seconds,
+        "pairing_peak_mb": peak_mb,
+        "articles_per_second": round(len(mains) / pairing_seconds, 3),
+        "comparisons_per_second": round(
+            len(mains) * datastore.loaded / pairing_seconds, 3
+        ),
+    }
+
+
+def get_environment():
+    """Returns details about the machine and the library versions used."""
+    return {
+        "date": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bias pairing.")
+    parser.add_argument(
+        "-s", "--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+        help="corpus sizes to benchmark"
+    )
+    parser.add_argument(
+        "-b", "--batch", type=int, default=DEFAULT_BATCH,
+        help="newest articles paired against the rest of the corpus"
+    )
+    parser.add_argument(
+        "--no-lsh", action="store_true",
+        help="retrieve candidates through the keywords index"
+    )
+    parser.add_argument(
+        "--idf", action="store_true", help="weight the keywords by their IDF"
+    )
+    parser.add_argument(
+        "--keywords-ratio", type=float, default=STORY_KEYWORDS_RATIO,
+        help="keywords each article takes from its story"
+    )
+    parser.add_argument(
+        "--rewrite-ratio", type=float, default=STORY_REWRITE_RATIO,
+        help="story words each article replaces within its content"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed")
+    parser.add_argument(
+        "-o", "--output", help="JSON file receiving the results (default stdout)"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Keys are created locally only, no request is made with these credentials.
+    client = ndb.Client(credentials=AnonymousCredentials(), **ndb_kwargs())
+    results = []
+    with client.context():
+        for size in args.sizes:
+            logging.info("Benchmarking pairing over %d articles...", size)
+            result = run_benchmark(
+                size, batch_size=args.batch, lsh=not args.no_lsh, idf=args.idf,
+                seed=args.seed, keywords_ratio=args.keywords_ratio,
+                rewrite_ratio=args.rewrite_ratio
+            )
+            logging.info(
+                "%d candidates, %d pairs (%.1f%% recall) in %.3fs (%.1f articles/s).",
+                result["candidates"], result["pairs"], result["recall"] * 100,
+                result["pairing_seconds"], result["articles_per_second"]
+            )
+            results.append(result)
+
+    report = json.dumps(
+        {"environment": get_environment(), "results": results}, indent=2
+    )
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
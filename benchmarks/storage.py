@@ -0,0 +1,131 @@
+"""Local storage stand-ins used instead of the remote services."""
+
+
+import contextlib
+from unittest import mock
+
+from truestory.models.index import KeywordIndex, LshIndex, PairScoreStore
+from truestory.tasks import article as article_tasks
+
+
+class LocalPipeline:
+
+    """Queues the commands and runs them at once, like a Redis pipeline."""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        return lambda *args, **kwargs: self._commands.append((method, args, kwargs))
+
+    def execute(self):
+        results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+class LocalRedis:
+
+    """In memory replacement for the few Redis commands used by the indexes."""
+
+    def __init__(self):
+        self._data = {}
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+    def get(self, name):
+        return self._data.get(name)
+
+    def set(self, name, value):
+        self._data[name] = value
+
+    def delete(self, *names):
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    def _remove_items(self, name, items, remove):
+        container = self._data.get(name)
+        if container is None:
+            return 0
+
+        count = sum(remove(container, item) for item in items)
+        if not container:
+            del self._data[name]
+        return count
+
+    def hset(self, name, key, value):
+        self._data.setdefault(name, {})[key] = value
+
+    def hdel(self, name, *keys):
+        return self._remove_items(
+            name, keys, lambda hash_, key: hash_.pop(key, None) is not None
+        )
+
+    def hgetall(self, name):
+        return dict(self._data.get(name, {}))
+
+    def hlen(self, name):
+        return len(self._data.get(name, {}))
+
+    def sadd(self, name, *values):
+        set_ = self._data.setdefault(name, set())
+        count = len(set_)
+        set_.update(values)
+        return len(set_) - count
+
+    def srem(self, name, *values):
+        def remove(set_, value):
+            found = value in set_
+            set_.discard(value)
+            return found
+
+        return self._remove_items(name, values, remove)
+
+    def smembers(self, name):
+        return set(self._data.get(name, set()))
+
+    def scard(self, name):
+        return len(self._data.get(name, set()))
+
+
+class LocalDatastore:
+
+    """Serves the articles and keeps the bias pairs the pairing task reads and
+    writes, counting the loaded articles.
+    """
+
+    def __init__(self, articles):
+        self._articles = {article.key: article for article in articles}
+        self.bias_pairs = {}
+        self.loaded = 0
+
+    def get_multi(self, keys):
+        self.loaded += len(keys)
+        return [self._articles[key] for key in keys if key in self._articles]
+
+    def put_multi(self, bias_pairs):
+        for bias_pair in bias_pairs:
+            self.bias_pairs[bias_pair.key.id()] = bias_pair
+        return [bias_pair.key for bias_pair in bias_pairs]
+
+
+@contextlib.contextmanager
+def local_pairing(datastore, client):
+    """Runs the pairing task against the `datastore` and Redis `client` stand-ins
+    instead of the remote services.
+    """
+    with contextlib.ExitStack() as stack:
+        for name, value in (
+                ("keyword_index", KeywordIndex(client=client)),
+                ("lsh_index", LshIndex(client=client)),
+                ("pair_scores", PairScoreStore(client=client))):
+            stack.enter_context(mock.patch.object(article_tasks, name, value))
+        stack.enter_context(mock.patch.object(
+            article_tasks.ArticleModel, "get_multi", datastore.get_multi
+        ))
+        stack.enter_context(mock.patch.object(
+            article_tasks.BiasPairModel, "put_multi", datastore.put_multi
+        ))
+        yield article_tasks
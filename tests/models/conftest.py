@@ -13,6 +13,7 @@ from truestory.models import (
 )
 from truestory.models import get_client
 from truestory.models.base import BaseModel, SideMixin, ndb
+from truestory.models.index import pair_scores, unindex_articles
 
 
 NO_CREDENTIALS = not bool(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
@@ -150,4 +151,7 @@ def datastore_cleanup():
     for Model in CLEANUP_MODELS:
         keys = Model.all(keys_only=True)
         all_keys.extend(keys)
+    article_keys = ArticleModel.all(keys_only=True)
+    unindex_articles(article_keys)
+    pair_scores.remove_articles(article_keys)
     BaseModel.remove_multi(all_keys)
@@ -1,10 +1,18 @@
 """Tests articles and bias pairs."""
 
 
+import json
+
 import pytest
+from flask import url_for
 from google.cloud.ndb import exceptions as ndb_exceptions
-from truestory.models import ArticleModel, BiasPairModel
-from truestory.tasks.article import clean_articles, pair_article
+from truestory import app
+from truestory.models import ArticleModel, BiasPairModel, PreferencesModel
+from truestory.models.index import keyword_index, link_index
+from truestory.tasks.article import (
+    clean_articles, pair_article, pair_articles, rescore_pairs
+)
+from truestory.tasks.util import TASK_HEADER, app_client
 
 from .conftest import skip_no_datastore, wait_state
 
@@ -20,12 +28,19 @@ def test_bias_pair_save(bias_pair_ents):
     assert new_bias_pair.left.get().title.startswith("TrueStory")
     assert new_bias_pair.right.get().source_name.startswith("BBC")
 
+    # Article details are copied into the pair too.
+    assert new_bias_pair.left_card.title == left.title
+    assert new_bias_pair.right_card.urlsafe == right.urlsafe
+    assert set(new_bias_pair.keywords) == {"trump", "money", "mad"}
+
 
 def test_related_articles(bias_pair_ents):
     left, right, bias_pair = bias_pair_ents
 
     rev_bias_pair = BiasPairModel(left=bias_pair.right, right=bias_pair.left)
     rev_bias_pair.put()
+    assert rev_bias_pair.key == bias_pair.key, "pair saved twice"
+    assert BiasPairModel.get_between(right.key, left.key).key == bias_pair.key
 
     articles = ArticleModel.get_related_articles(left.key)
     assert len(articles) == 1, "duplicate articles"
@@ -42,6 +57,26 @@ def test_cleanup(bias_pair_ents):
     assert not any_alive, "entities aren't cleaned up"
 
 
+def test_keyword_index(left_article_ent, right_article_ent):
+    ArticleModel.put_multi([left_article_ent, right_article_ent])
+
+    candidates = keyword_index.lookup(["mad"])
+    assert list(candidates) == [right_article_ent.urlsafe], "wrong indexed articles"
+    assert candidates[right_article_ent.urlsafe]["meta"]["side"] == 2
+
+    clean_articles()
+    assert not keyword_index.lookup(["trump", "money", "mad"]), "index not pruned"
+
+
+def test_link_index(left_article_ent, right_article_ent):
+    left_article_ent.put()
+    links = [left_article_ent.link, right_article_ent.link]
+    assert link_index.has_terms(links) == [True, False]
+
+    clean_articles()
+    assert link_index.has_terms(links) == [False, False], "index not pruned"
+
+
 def test_duplicate(left_article_ent, right_article_ent):
     left_article_ent.put()
     wait_state(left_article_ent)
@@ -89,6 +124,51 @@ def test_pair_article(left_article_ent, right_article_ent):
     )
 
 
+def test_pair_articles(left_article_ent, right_article_ent):
+    article_keys = ArticleModel.put_multi([left_article_ent, right_article_ent])
+    wait_state([left_article_ent, right_article_ent])
+
+    # Both articles are paired with each other, but only one pair gets saved.
+    pair_articles([key.urlsafe().decode() for key in article_keys])
+    assert len(BiasPairModel.all()) == 1, "duplicate or no bias pairs created"
+
+
+def test_pair_articles_task(left_article_ent, right_article_ent):
+    article_keys = ArticleModel.put_multi([left_article_ent, right_article_ent])
+    wait_state([left_article_ent, right_article_ent])
+
+    # The batch task shares its queue with the single article one, but it has to
+    # reach its own handler.
+    with app.test_request_context():
+        url = url_for("pair_articles")
+    data = json.dumps({
+        "args": [[key.urlsafe().decode() for key in article_keys]], "kwargs": {}
+    })
+    response = app_client.post(url, headers={TASK_HEADER: "test_task"}, data=data)
+    assert response.json["result"] == {"bias_pairs": 1}, "batch task not reached"
+    assert len(BiasPairModel.all()) == 1
+
+
+def test_rescore_pairs(left_article_ent, right_article_ent):
+    article_keys = ArticleModel.put_multi([left_article_ent, right_article_ent])
+    wait_state([left_article_ent, right_article_ent])
+    pair_articles([key.urlsafe().decode() for key in article_keys])
+    assert len(BiasPairModel.all()) == 1
+
+    # Their similarity is 0.83, so a stricter threshold drops the pair and the
+    # previous one brings it back, without pairing them again.
+    prefs = PreferencesModel.cached()
+    similarity_threshold = prefs.similarity_threshold
+    try:
+        prefs.similarity_threshold = 0.9
+        assert rescore_pairs() == {"added": 0, "removed": 1}
+        assert not BiasPairModel.all()
+    finally:
+        prefs.similarity_threshold = similarity_threshold
+    assert rescore_pairs() == {"added": 1, "removed": 0}
+    assert len(BiasPairModel.all()) == 1
+
+
 def test_article_side(bias_pair_ents):
     wait_state(bias_pair_ents)
     assert bias_pair_ents[0].side == -2
@@ -0,0 +1,22 @@
+"""Tests the global preferences and their cache."""
+
+
+from truestory.models import PreferencesModel
+
+from .conftest import skip_no_datastore
+
+
+pytestmark = skip_no_datastore
+
+
+def test_preferences_cache():
+    prefs = PreferencesModel.cached()
+    assert PreferencesModel.cached() is prefs, "preferences not cached"
+
+    # Any save invalidates the cached instance.
+    fresh_prefs = PreferencesModel.instance()
+    fresh_prefs.put()
+    assert fresh_prefs.version == prefs.version + 1
+    assert PreferencesModel.cached().version == fresh_prefs.version, (
+        "outdated preferences"
+    )
@@ -0,0 +1,88 @@
+"""Tests the bias scoring algorithms."""
+
+
+import random
+
+import addict
+import numpy as np
+
+from truestory import algo
+
+
+KEYWORDS = [f"keyword{idx}" for idx in range(30)]
+
+
+def _random_articles(count):
+    articles = []
+    for _ in range(count):
+        # Duplicated and missing keywords included.
+        keywords = random.choices(KEYWORDS, k=random.randint(0, 12))
+        side = random.randint(-2, 2)
+        articles.append(addict.Dict(keywords=keywords, side=side))
+    return articles
+
+
+def test_batch_scores():
+    mains, candidates = _random_articles(20), _random_articles(50)
+    similarity = algo._get_similarity_scores(mains, candidates)
+    contradiction = algo._get_contradiction_scores(mains, candidates)
+    assert similarity.shape == contradiction.shape == (20, 50)
+
+    for row, main in enumerate(mains):
+        for col, candidate in enumerate(candidates):
+            assert similarity[row, col] == algo._get_similarity_score(
+                main, candidate
+            )
+            assert contradiction[row, col] == algo._get_contradiction_score(
+                main, candidate
+            )
+
+
+def test_minhash():
+    keywords = ["trade", "deal", "china", "talks", "president"]
+    article = addict.Dict(keywords=keywords)
+    similar = addict.Dict(keywords=keywords[:4] + ["week"])
+    different = addict.Dict(keywords=["football", "team", "cup"])
+
+    signature = algo.get_minhash(article)
+    assert len(signature) == algo.MINHASH_PERMUTATIONS
+    assert signature == algo.get_minhash(article), "non-deterministic signature"
+
+    agreement = lambda other: sum(
+        first == second for first, second in zip(signature, algo.get_minhash(other))
+    )
+    assert agreement(similar) > agreement(different)
+    assert algo.get_minhash(addict.Dict(keywords=[])) == []
+
+
+def test_lsh_recall():
+    # Pairs of 10 keywords each, sharing 5 of them (a 0.5 similarity).
+    pairs = []
+    for _ in range(200):
+        keywords = random.sample(KEYWORDS, 15)
+        pairs.append((
+            addict.Dict(keywords=keywords[:10]), addict.Dict(keywords=keywords[5:])
+        ))
+    assert algo._get_similarity_score(*pairs[0]) == 0.5
+
+    get_bands = lambda article: set(algo.get_lsh_bands(article, bands=64, rows=2))
+    found = sum(bool(get_bands(main) & get_bands(other)) for main, other in pairs)
+    assert found / len(pairs) >= 0.95, "similar articles missed by LSH"
+
+
+def test_idf_similarity():
+    mains, candidates = _random_articles(10), _random_articles(20)
+    # Uniform weights keep the plain similarity.
+    uniform_idf = dict.fromkeys(KEYWORDS, 3.0)
+    assert np.allclose(
+        algo._get_similarity_scores(mains, candidates, idf=uniform_idf),
+        algo._get_similarity_scores(mains, candidates)
+    )
+
+    main = addict.Dict(keywords=["common", "rare"])
+    candidates = [addict.Dict(keywords=["common"]), addict.Dict(keywords=["rare"])]
+    idf = algo.get_idf({"common": 90, "rare": 1}, 100)
+    common_score, rare_score = algo._get_similarity_scores(
+        [main], candidates, idf=idf
+    )[0]
+    assert rare_score > common_score
@@ -0,0 +1,230 @@
+"""Tests crawling utilities."""
+
+
+import collections
+import datetime
+import json
+import os
+import threading
+import time
+import types
+
+import addict
+import feedparser
+import pytest
+
+from truestory.crawlers import RssCrawler, common, report, rss_feed, stream
+from truestory.models import RssTargetModel, get_client
+from truestory.models.index import LinkIndex
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+SUMMARIES_PATH = os.path.join(DATA_DIR, "feed_summaries.json")
+FEED_PATHS = [
+    os.path.join(DATA_DIR, name) for name in ("feed_rss.xml", "feed_atom.xml")
+]
+FEED_BASE = "https://www.example.com/feed"
+
+with open(SUMMARIES_PATH) as summaries_file:
+    SUMMARIES = json.load(summaries_file)
+
+
+@pytest.mark.parametrize("summary", SUMMARIES)
+def test_strip_html(summary):
+    # Same text as the one obtained through the full HTML5 parsing.
+    expected = common._strip_html_fully(summary) if summary else summary
+    assert common.strip_html(summary) == expected
+
+
+def test_strip_html_fast_path():
+    # Plain text and simple fragments don't need the full parsing.
+    simple = [
+        summary for summary in SUMMARIES
+        if common._SimpleHTMLStripper().strip(summary) is not None
+    ]
+    assert len(simple) > len(SUMMARIES) / 2
+
+
+def _read_feed(path):
+    with open(path, "rb") as feed_file:
+        return feed_file.read()
+
+
+@pytest.mark.parametrize("path", FEED_PATHS)
+def test_parse_feed(path):
+    # Entries have the same crawled fields as the ones parsed by `feedparser`.
+    content = _read_feed(path)
+    entries = list(stream.parse_feed(content, base=FEED_BASE).entries)
+    expected = feedparser.parse(
+        content, response_headers={"content-location": FEED_BASE}
+    ).entries
+    assert len(entries) == len(expected)
+    for entry, expected_entry in zip(entries, expected):
+        for field in ("id", "link", "title", "summary", "published_parsed"):
+            assert entry.get(field) == expected_entry.get(field), field
+
+
+def test_parse_feed_guid_link():
+    content = _read_feed(FEED_PATHS[0])
+    links = [entry.get("link") for entry in stream.parse_feed(content).entries]
+    # Permanent GUIDs only, the other ones are identifiers.
+    assert "https://www.example.com/news/bridge" in links
+    assert "markets-1" not in links
+
+
+def test_parse_feed_lazy():
+    content = _read_feed(FEED_PATHS[0])
+    entries = stream.parse_feed(content).entries
+    assert next(entries).id == "markets-1"
+    assert next(entries).id == "https://www.example.com/news/storm"
+
+    # Older entries are skipped.
+    since = datetime.datetime(2019, 10, 8, 7, tzinfo=datetime.timezone.utc)
+    entries = stream.parse_feed(content, since=since).entries
+    assert [entry.id for entry in entries] == ["markets-1"]
+
+
+def test_parse_feed_unsupported():
+    with pytest.raises(stream.UnsupportedFeed):
+        stream.parse_feed(b"<html><body>Not a feed</body></html>")
+
+
+def test_extract_entries_limit(monkeypatch):
+    links = [f"https://www.example.com/news/{idx}" for idx in range(6)]
+    known, failing = {links[0]}, {links[2]}
+    monkeypatch.setattr(
+        rss_feed.link_index, "has_terms",
+        lambda terms: [term in known for term in terms]
+    )
+    monkeypatch.setattr(
+        rss_feed.functions, "get_cached_articles",
+        lambda links, **kwargs: {
+            link: ValueError("failed") if link in failing else
+            types.SimpleNamespace(link=link, stats={})
+            for link in links
+        }
+    )
+    monkeypatch.setattr(
+        RssCrawler, "extract_article",
+        classmethod(lambda cls, entry, target, **kwargs: kwargs["news_article"].link)
+    )
+
+    # Saved and failed entries don't count towards the limit, so the next ones are
+    # extracted instead, without reading any further entries.
+    entries = iter(feedparser.FeedParserDict(link=link) for link in links)
+    target = addict.Dict(link=FEED_BASE, source_name="Example", site="example.com")
+    crawler = RssCrawler([target], limit=3)
+    articles, new_count = crawler._extract_entries(
+        entries, target, report.TargetReport(target)
+    )
+    assert articles == [links[1], links[3], links[4]]
+    assert new_count == 4
+    assert next(entries).link == links[5], "entries read past the limit"
+
+
+def test_skip_redirected_entry(monkeypatch):
+    entry_link = "https://feeds.example.com/~r/news/storm"
+    final_link = "https://www.example.com/news/storm"
+    news_article = types.SimpleNamespace(
+        url=entry_link, final_url=final_link, title="Storm", text="Text",
+        summary="", authors=[], publish_date=None, top_image=None, keywords=[]
+    )
+    target = addict.Dict(
+        link=FEED_BASE, source_name="Example", site="example.com",
+        side=RssTargetModel.SIDE_MAPPING["Center"]
+    )
+    entry = feedparser.FeedParserDict(link=entry_link)
+    with get_client().context():
+        article = RssCrawler.extract_article(entry, target, news_article=news_article)
+    assert article.link == final_link
+
+    # Known by the feed link too once saved, so it's not downloaded again.
+    known = set(LinkIndex().get_terms(article))
+    monkeypatch.setattr(
+        rss_feed.link_index, "has_terms",
+        lambda terms: [term in known for term in terms]
+    )
+    assert RssCrawler._skip_known_entries([entry], target) == []
+
+
+def test_crawl_targets_concurrently(monkeypatch):
+    sites = ["a.example.com"] * 4 + ["b.example.com"] * 2
+    targets = [
+        types.SimpleNamespace(
+            link=f"https://{site}/feed{idx}", source_name="Example", site=site,
+            last_modified=None, failures=0
+        )
+        for idx, site in enumerate(sites)
+    ]
+    for target in targets:
+        target.failed = lambda target=target: setattr(
+            target, "failures", target.failures + 1
+        )
+    failing = targets[1]
+    lock = threading.Lock()
+    running, most_running = collections.Counter(), collections.Counter()
+
+    def extract_articles(self, target, target_report):
+        with lock:
+            running[target.site] += 1
+            most_running[target.site] = max(
+                most_running[target.site], running[target.site]
+            )
+        time.sleep(0.05)
+        with lock:
+            running[target.site] -= 1
+        if target is failing:
+            raise ValueError("broken feed")
+        return [target.link]
+
+    monkeypatch.setattr(RssCrawler, "_extract_articles", extract_articles)
+    monkeypatch.setattr(
+        RssTargetModel, "save_changed", staticmethod(lambda targets: 0)
+    )
+    crawler = RssCrawler(targets, workers=len(targets), host_workers=2)
+    articles = crawler.crawl_targets()
+
+    # No more than two targets of the same site at once.
+    assert most_running["a.example.com"] == 2
+    # The failing target doesn't stop the others.
+    assert sorted(articles) == sorted(
+        target.link for target in targets if target is not failing
+    )
+    assert failing.failures == 1
+    assert crawler.report.get_totals()["errors"] == {"ValueError": 1}
+
+
+def test_extract_failed_entry():
+    # Entries parsed without an ID are logged by their link instead.
+    entry = feedparser.FeedParserDict(link="https://www.example.com/news/storm")
+    error = ValueError("unexpected markup")
+    assert RssCrawler._extract_entry(entry, None, news_article=error) is None
+
+
+def test_crawl_report():
+    crawl_report = report.CrawlReport()
+    for idx, status in enumerate(["ok", "ok", "error"]):
+        target = addict.Dict(
+            link=f"https://www.example.com/feed{idx}", source_name="Example",
+            site="example.com"
+        )
+        target_report = crawl_report.add_target(target)
+        target_report.status = status
+        target_report.seconds = idx
+        target_report.add_stats("feed", {"download": 0.5, "parse": 0.1, "bytes": 10})
+        target_report.add_stats("article", {"cached": True})
+        if status == "error":
+            target_report.add_error(ValueError("bad feed"))
+    with crawl_report.stage("pairing_enqueue"):
+        pass
+    crawl_report.finish()
+
+    summary = crawl_report.to_dict()
+    assert summary["statuses"] == {"ok": 2, "error": 1}
+    assert summary["stages"]["feed_download"] == 1.5
+    assert "pairing_enqueue" in summary["stages"]
+    assert summary["counts"] == {"feed_bytes": 30, "cached_articles": 3}
+    assert summary["errors"] == {"ValueError": 1}
+    # Slowest targets first.
+    assert summary["targets"][0]["link"].endswith("feed2")
+    assert "Slowest targets:" in crawl_report.format()
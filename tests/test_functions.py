@@ -0,0 +1,88 @@
+"""Tests the article parsing functions."""
+
+
+import datetime
+
+import requests
+from newspaper import ArticleException
+
+from truestory.functions import cache, parse_article, remote
+from truestory.functions.remote import NewsArticleAttr
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+def test_error_status():
+    get_status = parse_article._get_error_status
+    assert get_status(_http_error(404)) == 404
+    assert get_status(_http_error(403)) == 403
+    assert get_status(ArticleException("no article")) == 404
+    # Unexpected failures aren't reported as missing articles.
+    assert get_status(requests.Timeout()) == 500
+    assert get_status(LookupError("missing NLTK resource")) == 500
+
+
+def test_batch_timeout():
+    connect, read = remote._get_batch_timeout(1)
+    assert read > parse_article.TIMEOUT
+    # Waits longer for the bigger batches, parsed in more rounds.
+    _, batch_read = remote._get_batch_timeout(parse_article.BATCH_SIZE)
+    assert batch_read > read
+    assert remote._get_batch_timeout(parse_article.BATCH_WORKERS)[1] == read
+    assert connect == remote.settings.TIMEOUT
+
+
+def _news_article(link, final_url=None):
+    return NewsArticleAttr(
+        url=link, title="Title", text="Text", summary="", authors=[],
+        publish_date=datetime.datetime(2020, 1, 2, 3, 4, 5), top_image=None,
+        keywords=["text"], final_url=final_url or link
+    )
+
+
+def test_extraction_cache_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    extraction_cache = cache.ExtractionCache(":memory:", ttl=60, size=10)
+    extraction_cache.set(["https://example.com/a"], {"title": "A"})
+    assert extraction_cache.get("https://example.com/a") == {"title": "A"}
+
+    now += 60
+    assert extraction_cache.get("https://example.com/a") is None, "not expired"
+
+
+def test_extraction_cache_lru(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    extraction_cache = cache.ExtractionCache(":memory:", ttl=60, size=2)
+    for name in "ab":
+        extraction_cache.set([f"https://example.com/{name}"], {"title": name})
+        now += 1
+    # The first one gets used, so the second one is the least recently used.
+    assert extraction_cache.get("https://example.com/a")
+    now += 1
+    extraction_cache.set(["https://example.com/c"], {"title": "c"})
+
+    assert extraction_cache.get("https://example.com/a")
+    assert extraction_cache.get("https://example.com/b") is None, "not evicted"
+    assert extraction_cache.get("https://example.com/c")
+
+
+def test_extraction_cache_links():
+    extraction_cache = cache.ExtractionCache(":memory:", ttl=60, size=10)
+    article = _news_article(
+        "https://example.com/a?at_medium=RSS", final_url="https://example.com/b"
+    )
+    link = cache._get_canonical_link(article.url)
+    details = cache._write_cache(extraction_cache, link, article)
+    assert details.publish_date == article.publish_date
+
+    # Cached under both the requested and the final link.
+    for link in ("https://example.com/a", "https://example.com/b"):
+        cached = cache._read_cache(extraction_cache, link, link, use_cache=True)
+        assert cached.title == article.title
+        assert cached.stats == {"cached": True}
@@ -0,0 +1,150 @@
+"""Tests the crawling schedule of the RSS targets."""
+
+
+import datetime
+from http import HTTPStatus
+
+import feedparser
+import pytest
+from truestory import settings
+from truestory.crawlers import RssCrawler
+from truestory.models import RssTargetModel, get_client
+
+
+NOW = datetime.datetime(2020, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+def _hours(hours):
+    return datetime.timedelta(hours=hours)
+
+
+@pytest.fixture
+def rss_target(monkeypatch):
+    monkeypatch.setattr(RssTargetModel, "_now", staticmethod(lambda: NOW))
+    # Scheduled in memory only, with a given side, so the DB is never reached.
+    with get_client().context():
+        yield RssTargetModel(
+            source_name="Test", link="https://example.com/rss", site="example.com",
+            side=RssTargetModel.SIDE_MAPPING["Center"]
+        )
+
+
+def _interval(rss_target):
+    return (rss_target.next_crawl - NOW) / _hours(1)
+
+
+def test_reschedule_backoff(rss_target):
+    rss_target._reschedule(0)
+    assert rss_target.unchanged == 1
+    assert _interval(rss_target) == 2 * settings.CRAWL_MIN_INTERVAL
+
+    # Doubled with every crawl finding nothing new.
+    rss_target._reschedule(0)
+    assert rss_target.unchanged == 2
+    assert _interval(rss_target) == 4 * settings.CRAWL_MIN_INTERVAL
+
+    # And reset as soon as something new shows up.
+    rss_target._reschedule(5)
+    assert rss_target.unchanged == 0
+    assert rss_target.rate > 0
+
+
+def test_reschedule_clamping(rss_target):
+    # A very active feed isn't polled more often than the scheduling tick.
+    rss_target.crawled_at = NOW - _hours(1)
+    rss_target._reschedule(1000)
+    assert _interval(rss_target) == settings.CRAWL_MIN_INTERVAL
+    assert rss_target.crawled_at == NOW
+
+    # While a silent one still gets polled at least once in a while.
+    rss_target.rate = 0.0
+    rss_target.unchanged = 10
+    rss_target._reschedule(0)
+    assert _interval(rss_target) == settings.CRAWL_MAX_INTERVAL
+
+
+def test_is_due(rss_target):
+    assert rss_target.is_due(), "never crawled targets are due"
+
+    slack = _hours(settings.CRAWL_MIN_INTERVAL / 2)
+    rss_target.next_crawl = NOW + slack
+    assert rss_target.is_due()
+    assert rss_target.is_due(now=NOW - _hours(1)) is False
+    rss_target.next_crawl = NOW + slack + datetime.timedelta(seconds=1)
+    assert rss_target.is_due() is False
+
+
+@pytest.mark.parametrize("outcome", ["failed", "has_gone", "needs_auth"])
+def test_back_off(rss_target, outcome):
+    rss_target.rate = 1.0
+    rss_target.crawled_at = NOW - _hours(1)
+    getattr(rss_target, outcome)()
+    assert rss_target.changed
+    assert _interval(rss_target) == 2 * settings.CRAWL_EXPECTED_ENTRIES
+    getattr(rss_target, outcome)()
+    assert _interval(rss_target) == 4 * settings.CRAWL_EXPECTED_ENTRIES
+    getattr(rss_target, outcome)()
+    assert _interval(rss_target) == settings.CRAWL_MAX_INTERVAL
+
+    # Nothing was retrieved, so the publication rate stays the same.
+    assert rss_target.rate == 1.0
+    assert rss_target.crawled_at == NOW - _hours(1)
+
+
+def _crawl(rss_target, monkeypatch, get_recent_feed):
+    monkeypatch.setattr(
+        RssCrawler, "_get_recent_feed", classmethod(get_recent_feed)
+    )
+    crawler = RssCrawler([rss_target], workers=1)
+    articles = crawler._crawl_target(rss_target)
+    return articles, crawler.report.targets[0].status
+
+
+def test_crawl_failed_target(rss_target, monkeypatch):
+    def get_recent_feed(cls, target):
+        raise ValueError("broken feed")
+
+    articles, status = _crawl(rss_target, monkeypatch, get_recent_feed)
+    assert articles is None
+    assert status == "error"
+    assert not rss_target.is_due(), "failed target due on the next tick"
+
+
+@pytest.mark.parametrize("status, flag", [
+    (HTTPStatus.GONE, "gone"),
+    (HTTPStatus.UNAUTHORIZED, "auth_required"),
+])
+def test_crawl_dead_target(rss_target, monkeypatch, status, flag):
+    def get_recent_feed(cls, target):
+        response = feedparser.FeedParserDict(status=status, bozo=False, entries=[])
+        return response, None, None
+
+    articles, _ = _crawl(rss_target, monkeypatch, get_recent_feed)
+    assert articles == []
+    assert getattr(rss_target, flag)
+    assert not rss_target.is_due(), "dead target due on the next tick"
+
+
+def test_save_changed(rss_target, monkeypatch):
+    saved = []
+    monkeypatch.setattr(
+        RssTargetModel, "put_multi",
+        classmethod(lambda cls, targets: saved.append(targets))
+    )
+    targets = [rss_target] + [
+        RssTargetModel(
+            source_name="Test", link=f"https://example.com/rss{idx}",
+            site="example.com", side=RssTargetModel.SIDE_MAPPING["Center"]
+        )
+        for idx in range(3)
+    ]
+    targets[0].not_modified()
+    targets[2].failed()
+
+    # Only the changed ones, all of them at once.
+    assert RssTargetModel.save_changed(targets) == 2
+    assert saved == [[targets[0], targets[2]]]
+
+    saved.clear()
+    assert RssTargetModel.save_changed(targets[1:2]) == 0
+    assert not saved
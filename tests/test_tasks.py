@@ -0,0 +1,59 @@
+"""Tests the tasks which don't need the Datastore."""
+
+
+from truestory.crawlers import report
+from truestory.tasks import article as article_tasks
+
+
+def _stub_saving(monkeypatch, events, failing=()):
+    def put_multi(articles):
+        events.append(("save", articles))
+        if articles[0] in failing:
+            raise ValueError("Datastore unavailable")
+        return [f"key-{article}" for article in articles]
+
+    monkeypatch.setattr(article_tasks.ArticleModel, "put_multi", put_multi)
+    monkeypatch.setattr(article_tasks, "key_to_urlsafe", str)
+    monkeypatch.setattr(
+        article_tasks, "pair_articles",
+        lambda usafes: events.append(("pair", usafes))
+    )
+
+
+def _stream(events, count):
+    for idx in range(count):
+        events.append(("crawl", idx))
+        yield idx
+
+
+def test_save_articles_chunks(monkeypatch):
+    events = []
+    _stub_saving(monkeypatch, events)
+    crawl_report = report.CrawlReport()
+    count = article_tasks.save_articles(
+        _stream(events, 5), chunk_size=2, report=crawl_report
+    )
+    assert count == 5
+
+    # Each chunk is saved and paired before crawling the next articles.
+    assert events == [
+        ("crawl", 0), ("crawl", 1),
+        ("save", [0, 1]), ("pair", ["key-0", "key-1"]),
+        ("crawl", 2), ("crawl", 3),
+        ("save", [2, 3]), ("pair", ["key-2", "key-3"]),
+        ("crawl", 4),
+        ("save", [4]), ("pair", ["key-4"]),
+    ]
+    assert {"articles_save", "pairing_enqueue"} <= set(crawl_report.stages)
+
+
+def test_save_articles_failed_chunk(monkeypatch):
+    events = []
+    _stub_saving(monkeypatch, events, failing={2})
+    count = article_tasks.save_articles(_stream(events, 5), chunk_size=2)
+
+    # The failed chunk isn't paired nor counted, but the next ones are saved still.
+    assert count == 3
+    assert [usafes for name, usafes in events if name == "pair"] == [
+        ["key-0", "key-1"], ["key-4"]
+    ]
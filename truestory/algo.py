@@ -3,20 +3,46 @@ the articles.
 """
 
 
+import collections
+import hashlib
 import logging
+import math
+import zlib
 
-from truestory.models import PreferencesModel
+import numpy as np
+from scipy import sparse
 
+from truestory import settings
 
-# NOTE(cmiN): Lazy preferences instance.
-prefs = None
+
+# Matrices of shape (mains, candidates) obtained by scoring articles in batches.
+BiasScores = collections.namedtuple(
+    "BiasScores", ["contradiction", "similarity", "score", "mask"]
+)
+
+# MinHash signature settings (changing them requires re-indexing all articles).
+MINHASH_PERMUTATIONS = 128
+MINHASH_PRIME = (1 << 31) - 1
+MINHASH_SEED = 764
+
+_minhash_random = np.random.RandomState(MINHASH_SEED)
+MINHASH_A = _minhash_random.randint(
+    1, MINHASH_PRIME, size=MINHASH_PERMUTATIONS
+).astype(np.uint64)
+MINHASH_B = _minhash_random.randint(
+    0, MINHASH_PRIME, size=MINHASH_PERMUTATIONS
+).astype(np.uint64)
+
+
+# Lazily loaded, so the models can use the algorithms too.
+PreferencesModel = None
 
 
 def _get_preferences():
-    global prefs
-    if not prefs:
-        prefs = PreferencesModel.instance()
-    return prefs
+    global PreferencesModel
+    if not PreferencesModel:
+        from truestory.models.preferences import PreferencesModel
+    return PreferencesModel.cached()
 
 
 def _get_similarity_score(main, candidate):
@@ -64,3 +90,188 @@ def get_bias_score(main, candidate):
         return False, 0
 
     return True, (contradiction_score + similarity_score) / 2
+
+
+def _encode_keywords(*article_groups):
+    """Encodes the unique keywords of every group of articles as a sparse binary
+    matrix over a vocabulary shared by all the groups.
+
+    Returns:
+        tuple: The list of matrices and the vocabulary (list of keywords).
+    """
+    vocabulary = {}
+    coordinates = []
+    for articles in article_groups:
+        rows, cols = [], []
+        for row, article in enumerate(articles):
+            for keyword in set(article.keywords or []):
+                rows.append(row)
+                cols.append(vocabulary.setdefault(keyword, len(vocabulary)))
+        coordinates.append((len(articles), rows, cols))
+
+    matrices = []
+    for count, rows, cols in coordinates:
+        data = np.ones(len(rows), dtype=np.float64)
+        matrix = sparse.csr_matrix(
+            (data, (rows, cols)), shape=(count, len(vocabulary))
+        )
+        matrices.append(matrix)
+    return matrices, list(vocabulary)
+
+
+def get_idf(frequencies, total):
+    """Returns the smoothed inverse document frequency of each keyword, given its
+    document `frequencies` out of `total` documents.
+    """
+    return {
+        keyword: math.log((1 + total) / (1 + frequency)) + 1
+        for keyword, frequency in frequencies.items()
+    }
+
+
+def _get_keyword_weights(vocabulary, idf=None):
+    """Returns the weight of each keyword in `vocabulary` (1 if not `idf` weighted).
+    """
+    if idf is None:
+        return np.ones(len(vocabulary), dtype=np.float64)
+
+    # Keywords not seen yet by the IDF table are the rarest ones.
+    default = max(idf.values(), default=1.0)
+    return np.array([idf.get(keyword, default) for keyword in vocabulary])
+
+
+def _get_keyword_overlap(mains, candidates, idf=None):
+    """Returns the (weighted) count of shared keywords between every main and
+    candidate, along the total (weighted) keyword count of each of them.
+    """
+    (mains_kw, candidates_kw), vocabulary = _encode_keywords(mains, candidates)
+    weights = _get_keyword_weights(vocabulary, idf=idf)
+    mains_kw = mains_kw @ sparse.diags(weights)
+    shared = (mains_kw @ candidates_kw.T).toarray()
+    main_total = np.asarray(mains_kw.sum(axis=1)).ravel()
+    candidate_total = candidates_kw @ weights
+    return shared, main_total, candidate_total
+
+
+def _get_overlap_similarity(shared, main_total, candidate_total):
+    min_count = np.minimum.outer(main_total, candidate_total)
+    max_count = np.maximum.outer(main_total, candidate_total)
+
+    # Same operations (and order) as the scalar version, for identical results.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        miss_weight = 1 / max_count / 2
+        match_weight = (1 - miss_weight * (max_count - min_count)) / min_count
+        scores = shared * match_weight
+    return np.where(min_count > 0, scores, 0.0)
+
+
+def _get_similarity_scores(mains, candidates, idf=None):
+    """Vectorized `_get_similarity_score` between every main and candidate, with the
+    keywords optionally weighted by their `idf`.
+    """
+    return _get_overlap_similarity(
+        *_get_keyword_overlap(mains, candidates, idf=idf)
+    )
+
+
+def _get_contradiction_scores(mains, candidates):
+    """Vectorized `_get_contradiction_score` between every main and candidate."""
+    main_sides = np.array([main.side for main in mains], dtype=np.int64)
+    candidate_sides = np.array(
+        [candidate.side for candidate in candidates], dtype=np.int64
+    )
+    delta = np.abs(np.subtract.outer(main_sides, candidate_sides))
+    return delta * 0.25
+
+
+def score_pairs(mains, candidates, idf=None):
+    """Scores all the `mains` against all the `candidates` at once.
+
+    When an `idf` table is given, the shared keywords are weighted by their IDF and
+    the candidates sharing less information than the preferred floor with every
+    main are pruned before scoring them.
+
+    Returns:
+        BiasScores: Contradiction, similarity and final score matrices, plus the
+            mask of pairs passing both thresholds (same as `get_bias_score`).
+    """
+    prefs = _get_preferences()
+    shape = (len(mains), len(candidates))
+
+    shared, main_total, candidate_total = _get_keyword_overlap(
+        mains, candidates, idf=idf
+    )
+    informative = shared >= (prefs.idf_floor if idf is not None else 0)
+    kept = informative.any(axis=0)
+    kept_candidates = [
+        candidate for candidate, keep in zip(candidates, kept) if keep
+    ]
+
+    contradiction, similarity = np.zeros(shape), np.zeros(shape)
+    contradiction[:, kept] = _get_contradiction_scores(mains, kept_candidates)
+    similarity[:, kept] = _get_overlap_similarity(
+        shared[:, kept], main_total, candidate_total[kept]
+    )
+    # Pairs sharing too little information aren't similar at all.
+    similarity[~informative] = 0.0
+    mask = (
+        informative &
+        (contradiction >= prefs.contradiction_threshold) &
+        (similarity >= prefs.similarity_threshold)
+    )
+    score = np.where(mask, (contradiction + similarity) / 2, 0.0)
+    return BiasScores(contradiction, similarity, score, mask)
+
+
+def score_candidates(main, candidates, idf=None):
+    """Scores a `main` article against all its `candidates` at once.
+
+    Returns:
+        BiasScores: With vectors instead of matrices (one value per candidate).
+    """
+    scores = score_pairs([main], candidates, idf=idf)
+    return BiasScores(*(matrix[0] for matrix in scores))
+
+
+def get_minhash(article):
+    """Returns the MinHash signature (list of integers) of an article's keywords.
+
+    Only the keywords are hashed, since they're the only ones scored by the
+    similarity, thus the signatures agree as much as the scored keywords do.
+    """
+    keywords = set(article.keywords or [])
+    if not keywords:
+        return []
+
+    hashes = np.array(
+        [zlib.crc32(keyword.encode(settings.ENCODING)) for keyword in keywords],
+        dtype=np.uint64
+    )
+    permuted = (np.outer(MINHASH_A, hashes) + MINHASH_B[:, None]) % MINHASH_PRIME
+    return permuted.min(axis=1).tolist()
+
+
+def get_lsh_bands(article, bands=None, rows=None):
+    """Returns the LSH band buckets in which the article falls.
+
+    More bands with fewer rows each raise the recall, while fewer bands with more
+    rows raise the precision (tuned through the preferences, if not given).
+    """
+    if bands is None or rows is None:
+        prefs = _get_preferences()
+        bands, rows = prefs.lsh_bands, prefs.lsh_rows
+    if not bands:
+        return []  # LSH disabled
+
+    signature = get_minhash(article)
+    if not signature:
+        return []
+
+    assert bands * rows <= len(signature), "not enough MinHash permutations"
+    signature = np.array(signature, dtype=np.uint64)
+    buckets = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows]
+        digest = hashlib.md5(chunk.tobytes()).hexdigest()
+        buckets.append(f"{bands}x{rows}:{band}:{digest}")
+    return buckets
@@ -5,7 +5,6 @@ import base64
 import hashlib
 import logging
 import os
-import urllib.request as urlopen
 
 import requests
 import yaml
@@ -21,11 +20,6 @@ def _get_secret_key():
     ).digest()
 
 
-def init_url_opening():
-    opener = misc.get_url_opener()
-    urlopen.install_opener(opener)
-
-
 def init_datastore_emulator():
     path = settings.DATASTORE_ENV
     if not path:
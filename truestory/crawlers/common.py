@@ -1,12 +1,42 @@
 """Common utilities and procedures used by any crawling technique."""
 
 
+import email.utils
+import logging
+import re
+import time
 import urllib.parse as urlparse
+from datetime import timezone
+from html.parser import HTMLParser
+from http import HTTPStatus
 
+import feedparser
 from bs4 import BeautifulSoup
 
+from truestory import misc
+from truestory.crawlers.stream import UnsupportedFeed, parse_feed
+
 
 ALLOWED_QUERY_PARAMS = {"id",}
+# Statuses handled by the crawler itself, without a feed to parse.
+EMPTY_FEED_STATUSES = {
+    HTTPStatus.NOT_MODIFIED, HTTPStatus.UNAUTHORIZED, HTTPStatus.GONE
+}
+PERMANENT_REDIRECTS = {
+    HTTPStatus.MOVED_PERMANENTLY, HTTPStatus.PERMANENT_REDIRECT
+}
+# Tags usually found in feed summaries, whose text comes out of the full HTML5
+# parsing exactly as it is written (no foster parenting, raw text or dropped
+# newlines).
+SIMPLE_TAGS = {
+    "a", "abbr", "address", "article", "aside", "b", "big", "blockquote", "br",
+    "center", "cite", "code", "dd", "del", "dfn", "div", "dl", "dt",
+    "em", "figcaption", "figure", "font", "footer", "h1", "h2", "h3", "h4", "h5",
+    "h6", "header", "hr", "i", "img", "ins", "kbd", "li", "mark", "nobr", "ol",
+    "p", "q", "s", "section", "small", "span", "strike", "strong", "sub", "sup",
+    "time", "tt", "u", "ul", "var", "wbr",
+}
+RE_NEWLINES = re.compile(r"\r\n?")
 
 
 def strip_article_link(link, site=None):
@@ -26,10 +56,165 @@ def strip_article_link(link, site=None):
     return urlparse.urlunsplit(parts)
 
 
+class _SimpleHTMLStripper(HTMLParser):
+
+    """Collects the text of HTML fragments made of simple tags only, giving up as
+    soon as something would be interpreted differently by a full HTML5 parser.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.simple = True
+
+    def _check_tag(self, tag):
+        if tag not in SIMPLE_TAGS:
+            self.simple = False
+
+    def handle_starttag(self, tag, attrs):
+        self._check_tag(tag)
+
+    def handle_endtag(self, tag):
+        self._check_tag(tag)
+
+    def handle_data(self, data):
+        # Stray "<" are possibly unfinished or bogus tags.
+        if "<" in data:
+            self.simple = False
+        self.parts.append(data)
+
+    def _give_up(self, *_):
+        self.simple = False
+
+    handle_comment = handle_decl = handle_pi = unknown_decl = _give_up
+
+    def strip(self, html):
+        self.feed(html)
+        self.close()
+        return "".join(self.parts) if self.simple else None
+
+
+def _strip_html_fully(html):
+    soup = BeautifulSoup(html, "html5lib")
+    return soup.text.strip()
+
+
 def strip_html(html):
-    """Returns the text only out of any potential HTML content."""
+    """Returns the text only out of any potential HTML content.
+
+    Plain text is returned as it is and simple fragments are stripped by a
+    lightweight parser, while anything else goes through the full (and slow)
+    HTML5 parsing, with the same result in every case.
+    """
     if not html:
         return html
 
-    soup = BeautifulSoup(html, "html5lib")
-    return soup.text.strip()
+    # NUL characters are replaced by the HTML5 parser.
+    if "\0" in html:
+        return _strip_html_fully(html)
+
+    # Newlines are normalized by the HTML5 parser before anything else.
+    html = RE_NEWLINES.sub("\n", html)
+    if "<" not in html and "&" not in html:
+        return html.strip()
+
+    text = _SimpleHTMLStripper().strip(html)
+    if text is None:
+        return _strip_html_fully(html)
+    return text.strip()
+
+
+def _format_http_date(date):
+    if not date.tzinfo:
+        date = date.replace(tzinfo=timezone.utc)
+    return email.utils.format_datetime(date.astimezone(timezone.utc), usegmt=True)
+
+
+def _time_entries(entries, stats):
+    """Yields the lazily parsed `entries`, adding the time spent parsing them to
+    the "parse" `stats`.
+    """
+    entries = iter(entries)
+    while True:
+        start = time.perf_counter()
+        try:
+            entry = next(entries, None)
+        finally:
+            stats["parse"] += time.perf_counter() - start
+        if entry is None:
+            return
+        yield entry
+
+
+def fetch_feed(link, modified=None, etag=None):
+    """Downloads a feed through the shared HTTP session and parses it with
+    `feedparser`, filling in the same response details it does when fetching by
+    itself (status, final link, e-tag and modified date).
+
+    RSS and Atom feeds are parsed incrementally instead, their entries not older
+    than `modified` being read only as they're iterated, while falling back to
+    `feedparser` for anything else.
+
+    Args:
+        link (str): Feed URL.
+        modified (datetime): Skip the feed if not modified since this date.
+        etag (str): Skip the feed if its e-tag still matches this one.
+    Returns:
+        FeedParserDict: Parsed feed (without entries if not modified), along the
+            download and parsing "stats" (the latter growing with the iterated
+            entries).
+    """
+    headers = {}
+    if modified:
+        headers["If-Modified-Since"] = _format_http_date(modified)
+    if etag:
+        headers["If-None-Match"] = etag
+    start = time.perf_counter()
+    response = misc.get_shared_session().get(link, headers=headers)
+    downloaded = time.perf_counter()
+
+    lazy = False
+    if response.status_code in EMPTY_FEED_STATUSES:
+        feed = feedparser.FeedParserDict(bozo=False, entries=[])
+    else:
+        response.raise_for_status()
+        response_headers = {
+            key.lower(): value for key, value in response.headers.items()
+        }
+        # Relative links within the feed are resolved against its final URL.
+        response_headers.setdefault("content-location", response.url)
+        try:
+            feed = parse_feed(
+                response.content, base=response_headers["content-location"],
+                since=modified
+            )
+            lazy = True
+        except UnsupportedFeed as exc:
+            logging.debug("Parsing the whole feed %r instead: %s", link, exc)
+            feed = feedparser.parse(
+                response.content, response_headers=response_headers
+            )
+
+    stats = feed["stats"] = {
+        "download": downloaded - start,
+        "parse": time.perf_counter() - downloaded,
+        "bytes": len(response.content),
+    }
+    if lazy:
+        feed["entries"] = _time_entries(feed.entries, stats)
+    feed["href"] = response.url
+    feed["status"] = response.status_code
+    if any(redirect.status_code in PERMANENT_REDIRECTS
+           for redirect in response.history):
+        feed["status"] = HTTPStatus.MOVED_PERMANENTLY
+
+    feed["etag"] = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if last_modified:
+        try:
+            last_modified = email.utils.parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            pass
+        else:
+            feed["modified_parsed"] = last_modified.utctimetuple()
+    return feed
@@ -0,0 +1,167 @@
+"""Crawling run report, telling where the time goes for each target."""
+
+
+import collections
+import contextlib
+import datetime
+import time
+
+
+PRECISION = 3  # decimals kept for the reported seconds
+
+
+def _round_stages(stages):
+    return {name: round(seconds, PRECISION) for name, seconds in stages.items()}
+
+
+@contextlib.contextmanager
+def _measure(stages, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] += time.perf_counter() - start
+
+
+class TargetReport:
+
+    """Stage timings, counters and errors of a single crawled target.
+
+    Each target is crawled by one thread only, so no locking is needed.
+    """
+
+    def __init__(self, target):
+        self.link = target.link
+        self.source_name = target.source_name
+        self.site = target.site
+        self.status = None
+        self.seconds = 0.0
+        self.stages = collections.Counter()  # seconds spent in each stage
+        self.counts = collections.Counter()  # entries, articles and bytes
+        self.errors = collections.Counter()  # by exception class name
+
+    def stage(self, name):
+        """Context manager measuring the time spent in the `name` stage."""
+        return _measure(self.stages, name)
+
+    def add_stats(self, prefix, stats):
+        """Adds the download and parsing `stats` of the feed or one of its articles.
+        """
+        for name, value in stats.items():
+            if name == "bytes":
+                self.counts[f"{prefix}_bytes"] += value
+            elif name == "cached":
+                self.counts[f"cached_{prefix}s"] += 1
+            else:
+                self.stages[f"{prefix}_{name}"] += value
+
+    def add_error(self, exc):
+        # Remote errors tell the type of the original exception.
+        name = getattr(exc, "error_type", None) or type(exc).__name__
+        self.errors[name] += 1
+
+    def to_dict(self):
+        return {
+            "link": self.link,
+            "source_name": self.source_name,
+            "site": self.site,
+            "status": self.status,
+            "seconds": round(self.seconds, PRECISION),
+            "stages": _round_stages(self.stages),
+            "counts": dict(self.counts),
+            "errors": dict(self.errors),
+        }
+
+
+class CrawlReport:
+
+    """Instruments a whole crawling run, per target and per stage.
+
+    The per-target stages run concurrently, so their sums can exceed the run's
+    wall time, while the run stages (saving and enqueuing the pairing) are measured
+    on their own.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.datetime.utcnow()
+        self.finished_at = None
+        self.seconds = None
+        self._start = time.perf_counter()
+        self.targets = []
+        self.stages = collections.Counter()
+
+    def add_target(self, target):
+        """Returns the report of the just started crawl of `target`."""
+        target_report = TargetReport(target)
+        self.targets.append(target_report)
+        return target_report
+
+    def stage(self, name):
+        """Context manager measuring the time spent in the `name` run stage."""
+        return _measure(self.stages, name)
+
+    def finish(self):
+        if self.finished_at:
+            return
+
+        self.finished_at = datetime.datetime.utcnow()
+        self.seconds = time.perf_counter() - self._start
+
+    def get_totals(self):
+        """Returns the stages, counters and errors summed over all the targets."""
+        totals = collections.defaultdict(collections.Counter)
+        for target_report in self.targets:
+            totals["stages"].update(target_report.stages)
+            totals["counts"].update(target_report.counts)
+            totals["errors"].update(target_report.errors)
+            totals["statuses"][target_report.status] += 1
+        totals["stages"].update(self.stages)
+        return totals
+
+    def to_dict(self):
+        totals = self.get_totals()
+        slowest = sorted(
+            self.targets, key=lambda target_report: target_report.seconds,
+            reverse=True
+        )
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at and self.finished_at.isoformat(),
+            "seconds": self.seconds and round(self.seconds, PRECISION),
+            "stages": _round_stages(totals["stages"]),
+            "counts": dict(totals["counts"]),
+            "errors": dict(totals["errors"]),
+            "statuses": dict(totals["statuses"]),
+            "targets": [target_report.to_dict() for target_report in slowest],
+        }
+
+    def format(self, slowest=10):
+        """Returns a human readable summary, with the `slowest` targets only."""
+        report = self.to_dict()
+        statuses = ", ".join(
+            f"{status}: {count}" for status, count in report["statuses"].items()
+        )
+        lines = [
+            f"Crawled {len(self.targets)} target(s) in {report['seconds']}s "
+            f"({statuses})."
+        ]
+        lines.append("Stages (seconds):")
+        for name, seconds in sorted(
+                report["stages"].items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {name:<20} {seconds:>10.3f}")
+        lines.append("Counts:")
+        for name, count in sorted(report["counts"].items()):
+            lines.append(f"  {name:<20} {count:>10}")
+        if report["errors"]:
+            lines.append("Errors:")
+            for name, count in sorted(
+                    report["errors"].items(), key=lambda item: item[1], reverse=True):
+                lines.append(f"  {name:<20} {count:>10}")
+        lines.append("Slowest targets:")
+        for target in report["targets"][:slowest]:
+            articles = target["counts"].get("articles", 0)
+            lines.append(
+                f"  {target['seconds']:>8.3f}s {target['status'] or '-':<12} "
+                f"{articles:>3} article(s)  {target['link']}"
+            )
+        return "\n".join(lines)
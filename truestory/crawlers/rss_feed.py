@@ -3,16 +3,23 @@
 
 import calendar
 import collections
+import itertools
 import logging
-import urllib.request as urlopen
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from http import HTTPStatus
 
 import feedparser
 
-from truestory import functions
-from truestory.crawlers.common import strip_article_link, strip_html
+from truestory import functions, settings
+from truestory.crawlers.common import fetch_feed, strip_article_link, strip_html
+from truestory.crawlers.report import CrawlReport
 from truestory.models.article import ArticleModel
+from truestory.models.base import get_client
+from truestory.models.rss import RssTargetModel
+from truestory.models.index import link_index
 
 
 class RssCrawler:
@@ -22,16 +29,37 @@ class RssCrawler:
     ALLOWED_EXCEPTIONS = (
         feedparser.CharacterEncodingOverride,
     )
-
-    def __init__(self, rss_targets, limit=None):
+    STATE_CHUNK_SIZE = 50  # crawled targets saved at once
+    # Reported crawling outcome of a target by its feed status.
+    STATUS_NAMES = {
+        HTTPStatus.GONE: "gone",
+        HTTPStatus.UNAUTHORIZED: "auth_required",
+        HTTPStatus.NOT_MODIFIED: "not_modified",
+        HTTPStatus.MOVED_PERMANENTLY: "moved",
+    }
+
+    def __init__(self, rss_targets, limit=None, workers=None, host_workers=None,
+                 entry_workers=None, refresh=False, report=None):
         """Instantiates with a RSS target list to crawl.
 
         Args:
             rss_targets (list): List of `RssTargetModel` objects.
             limit (int): How many results to crawl within each target.
+            workers (int): How many targets to crawl concurrently (1 for serial).
+            host_workers (int): Maximum targets of the same site crawled at once.
+            entry_workers (int): How many articles to extract concurrently within
+                each target (1 for serial).
+            refresh (bool): Extract the already saved articles too (skipped
+                otherwise), without using the extraction cache.
+            report (CrawlReport): Instruments the crawl (a new one if missing).
         """
         self._rss_targets = rss_targets
         self._limit = limit
+        self._workers = workers or settings.CRAWL_WORKERS
+        self._host_workers = host_workers or settings.CRAWL_HOST_WORKERS
+        self._entry_workers = entry_workers or settings.CRAWL_ENTRY_WORKERS
+        self._refresh = refresh
+        self.report = report or CrawlReport()
 
     @staticmethod
     def _time_to_date(parsed_time):
@@ -51,9 +79,12 @@ class RssCrawler:
         return min(date, datetime.utcnow())
 
     @classmethod
-    def extract_article(cls, feed_entry, target):
+    def extract_article(cls, feed_entry, target, use_cache=True, news_article=None):
         """Extracts all the information needed from a `feed_entry` and returns it as
         an `ArticleModel` object.
+
+        The article details previously extracted from the same link are reused,
+        unless `use_cache` is off or they are already given as `news_article`.
         """
         # Link is a mandatory field in the RSS. If missing, we cannot parse the
         # article.
@@ -61,9 +92,11 @@ class RssCrawler:
         if not link:
             raise KeyError("link missing from the feed article")
 
-        news_article = functions.get_article(link)
+        if not news_article:
+            news_article = functions.get_cached_article(link, use_cache=use_cache)
         link = news_article.url
-        _link = urlopen.urlopen(link).url
+        # Where the article download ended up, after following the redirects.
+        _link = news_article.final_url or link
         to_site = ArticleModel.url_to_site
         link_site = to_site(_link)
         if to_site(link) in link_site or target.site in link_site:
@@ -84,11 +117,14 @@ class RssCrawler:
             filter(None, [string.lower().strip() for string in strings])
         )
 
+        link = strip_article_link(link, site=target.site)
+        feed_link = strip_article_link(feed_entry["link"], site=target.site)
         article_ent = ArticleModel(
             source_name=target.source_name,
             # NOTE(cmiN): Use the final URL (after redirects), because based on this
             # we uniquely identify articles (primary key is `link`).
-            link=strip_article_link(link, site=target.site),
+            link=link,
+            feed_link=feed_link if feed_link != link else None,
             title=title,
             content=news_article.text,
             summary=strip_html(summary),
@@ -125,6 +161,7 @@ class RssCrawler:
         # Nothing new received from it.
         if response.status == HTTPStatus.NOT_MODIFIED:
             logging.info("RSS has no data for %r.", name)
+            target.not_modified()
             return False
 
         # URL has permanently moved, so we have to update target with the new one.
@@ -135,94 +172,196 @@ class RssCrawler:
         return True
 
     @classmethod
-    def _entries_after_date(cls, entries, date):
-        """Filters the `entries` which are older than the given `date`.
-
-        Returns:
-            tuple: A list of new entries and a new date to crawl afterwards.
+    def _entries_after_date(cls, entries, date, entry_dates):
+        """Yields the `entries` which aren't older than the given `date`, collecting
+        the dates of the yielded ones into `entry_dates`.
         """
-        new_entries = []
-        max_date = date
-
         for entry in entries:
             entry_date = cls._time_to_date(entry.get("published_parsed"))
-            if not max_date:
-                # `max_date` could be None if target's last modified date is not
-                # initialized yet.
-                max_date = entry_date
             if all([entry_date, date]) and entry_date <= date:
                 continue
 
-            new_entries.append(entry)
-            if entry_date and entry_date > max_date:
-                max_date = entry_date
-
-        return new_entries, max_date
+            if entry_date:
+                entry_dates.append(entry_date)
+            yield entry
 
     @classmethod
     def _get_recent_feed(cls, target):
-        """Retrieves the RSS feed through `feedparser` and updates the timestamp of
-        the last retrieval in order to avoid getting banned or having duplicate data.
+        """Retrieves the RSS feed through the shared HTTP session and updates the
+        timestamp of the last retrieval in order to avoid getting banned or having
+        duplicate data.
 
         Returns:
             tuple: Article, its modified date and the e-tag.
         """
-        response = feedparser.parse(
+        response = fetch_feed(
             target.link, modified=target.last_modified, etag=target.etag
         )
 
         # Some of the feeds offer one of these two tags and others none of them.
         modified = cls._time_to_date(response.get("modified_parsed"))
         etag = response.get("etag")
-
-        # In case RSS feed doesn't support modified tag, we compute it artificially.
-        if not modified:
-            response.entries, modified = cls._entries_after_date(
-                response.entries, target.last_modified
-            )
-
         return response, modified, etag
 
-    def _extract_articles(self, target):
+    def _extract_articles(self, target, target_report):
         """Parses the given RSS target, then extracts and returns all found articles.
         """
         feed_response, modified, etag = self._get_recent_feed(target)
+        target_report.status = self.STATUS_NAMES.get(feed_response.status, "ok")
+        try:
+            # Bozo is a tag which tells that the RSS hasn't been parsed correctly.
+            if feed_response.bozo:
+                exc = feed_response.bozo_exception
+                if not isinstance(exc, self.ALLOWED_EXCEPTIONS):
+                    raise exc
+
+            articles = []
+            if self._manage_status(feed_response, target):
+                entries = feed_response.entries
+                entry_dates = []
+                if not modified:
+                    # In case RSS feed doesn't support modified tag, we compute it
+                    # artificially out of the read entries.
+                    entries = self._entries_after_date(
+                        entries, target.last_modified, entry_dates
+                    )
+                articles, new_count = self._extract_entries(
+                    entries, target, target_report
+                )
+                if not modified:
+                    modified = max(
+                        filter(None, [target.last_modified] + entry_dates),
+                        default=None
+                    )
+                target.checkpoint(modified, etag, new_count=new_count)
+        finally:
+            # The lazily parsed entries add to the parsing time while being read.
+            target_report.add_stats("feed", feed_response.get("stats", {}))
+
+        return articles
+
+    @staticmethod
+    def _skip_known_entries(entries, target):
+        """Returns the feed `entries` whose articles aren't saved already, checking
+        all their links at once before downloading any of them.
+        """
+        links = [
+            strip_article_link(entry["link"], site=target.site)
+            for entry in entries if entry.get("link")
+        ]
+        try:
+            known = set(
+                link for link, found in zip(links, link_index.has_terms(links))
+                if found
+            )
+        except Exception as exc:
+            logging.warning("Couldn't check the already saved articles: %s", exc)
+            return entries
+
+        new_entries = [
+            entry for entry in entries
+            if not entry.get("link") or
+            strip_article_link(entry["link"], site=target.site) not in known
+        ]
+        logging.debug(
+            "Skipping %d already saved articles of %r.",
+            len(entries) - len(new_entries), target.link
+        )
+        return new_entries
+
+    @classmethod
+    def _extract_entry(cls, feed_entry, target, use_cache=True, news_article=None,
+                       target_report=None):
+        """Returns the article extracted out of `feed_entry` or None on errors.
+
+        The `news_article` already obtained for it can be the exception raised
+        while doing so.
+        """
+        try:
+            if isinstance(news_article, Exception):
+                raise news_article
+            return cls.extract_article(
+                feed_entry, target, use_cache=use_cache, news_article=news_article
+            )
+        except Exception as exc:
+            if target_report:
+                target_report.counts["entries_failed"] += 1
+                target_report.add_error(exc)
+            # NOTE(cmiN): On Stackdriver Error Reporting we don't want to catch
+            # (with `logging.exception`) "Not Found" errors, because they are
+            # pretty frequent and usual, therefore ignore-able.
+            log_function = (
+                logging.error if "404" in str(exc) else logging.exception
+            )
+            log_function(
+                "Got %s while parsing %r.", exc,
+                feed_entry.get("id") or feed_entry.get("link")
+            )
+            return None
+
+    def _extract_entries(self, entries, target, target_report):
+        """Extracts the articles out of the (lazily read) feed `entries`, getting the
+        details of their links in batches.
 
-        # Bozo is a tag which tells that the RSS hasn't been parsed correctly.
-        if feed_response.bozo:
-            exc = feed_response.bozo_exception
-            if not isinstance(exc, self.ALLOWED_EXCEPTIONS):
-                raise exc
+        The entries are read in windows as large as the number of articles still
+        allowed by the limit, then the already saved ones are skipped, so the same
+        articles are returned (in the same feed order) as when extracting them one
+        by one until the limit is reached, without reading any further entries.
 
+        Returns:
+            tuple: The extracted articles and how many new entries were read.
+        """
+        entries = iter(entries)
+        use_cache = not self._refresh
         articles = []
-        count = 0
-        if self._manage_status(feed_response, target):
-            for feed_entry in feed_response.entries:
-                if self._limit and count >= self._limit:
+        new_count = 0
+        while True:
+            window = None
+            if self._limit:
+                window = self._limit - len(articles)
+                if window <= 0:
                     logging.info(
-                        "Crawling limit of %d article(s) was reached for this target.",
-                        count
+                        "Crawling limit of %d article(s) was reached for this "
+                        "target.", len(articles)
                     )
                     break
-                try:
-                    article = self.extract_article(feed_entry, target)
-                except Exception as exc:
-                    # NOTE(cmiN): On Stackdriver Error Reporting we don't want to catch
-                    # (with `logging.exception`) "Not Found" errors, because they are
-                    # pretty frequent and usual, therefore ignore-able.
-                    log_function = (
-                        logging.error if "404" in str(exc) else logging.exception
-                    )
-                    log_function("Got %s while parsing %r.", exc, feed_entry.id)
-                else:
-                    articles.append(article)
-                    count += 1
-            target.checkpoint(modified, etag)
 
-        return articles
+            batch = list(itertools.islice(entries, window))
+            if not batch:
+                break
+            target_report.counts["entries_seen"] += len(batch)
+            if not self._refresh:
+                with target_report.stage("skip_known"):
+                    new_batch = self._skip_known_entries(batch, target)
+                target_report.counts["entries_skipped"] += len(batch) - len(new_batch)
+                batch = new_batch
+            new_count += len(batch)
+            if not batch:
+                continue
+
+            # A single call extracts the whole window, concurrently.
+            with target_report.stage("extract"):
+                news_articles = functions.get_cached_articles(
+                    [entry["link"] for entry in batch if entry.get("link")],
+                    use_cache=use_cache, workers=self._entry_workers
+                )
+            for news_article in news_articles.values():
+                if not isinstance(news_article, Exception):
+                    target_report.add_stats("article", news_article.stats)
+            for feed_entry in batch:
+                article = self._extract_entry(
+                    feed_entry, target, use_cache=use_cache,
+                    news_article=news_articles.get(feed_entry.get("link")),
+                    target_report=target_report
+                )
+                if article:
+                    articles.append(article)
+        target_report.counts["articles"] += len(articles)
+        return articles, new_count
 
     def crawl_targets(self):
-        """Crawls the most recent feed from each of the given RSS targets.
+        """Crawls the most recent feed from each of the given RSS targets, concurrently
+        when more than one worker is allowed.
 
         Returns:
             dict: A list of articles by each target URL.
@@ -233,17 +372,122 @@ class RssCrawler:
             logging.warning("No targets available, check database.")
             return extracted_articles
 
-        for target in self._rss_targets:
-            link = target.link
-            logging.debug(
-                "Crawling target URL %r for articles newer than %s.",
-                link, target.last_modified
-            )
-            try:
-                articles = self._extract_articles(target)
-            except Exception as exc:
-                logging.exception("RSS target error with %r: %s", link, exc)
-            else:
-                extracted_articles[link].extend(articles)
+        links = [target.link for target in self._rss_targets]
+        results = dict(self._iter_results())
+        # Same order as the targets, no matter which one finished first.
+        for idx, link in enumerate(links):
+            if results[idx] is not None:
+                extracted_articles[link].extend(results[idx])
 
         return extracted_articles
+
+    def iter_articles(self):
+        """Yields the articles of each RSS target as soon as it gets crawled (in no
+        particular order), keeping in memory the articles of only a few targets at
+        once.
+        """
+        if not self._rss_targets:
+            logging.warning("No targets available, check database.")
+            return
+
+        for _, articles in self._iter_results():
+            yield from articles or []
+
+    def _iter_results(self):
+        """Yields (target index, crawling result) tuples as the targets get crawled.
+
+        The updated state of the crawled targets is saved in batches, after every
+        `STATE_CHUNK_SIZE` of them and at the end.
+        """
+        if self._workers > 1 and len(self._rss_targets) > 1:
+            results = self._crawl_concurrently()
+        else:
+            results = (
+                (idx, self._crawl_target(target))
+                for idx, target in enumerate(self._rss_targets)
+            )
+
+        crawled = []
+        try:
+            for idx, result in results:
+                crawled.append(self._rss_targets[idx])
+                if len(crawled) >= self.STATE_CHUNK_SIZE:
+                    self._save_targets(crawled)
+                    crawled = []
+                yield idx, result
+        finally:
+            self._save_targets(crawled)
+            self.report.finish()
+
+    def _save_targets(self, targets):
+        try:
+            with self.report.stage("targets_save"):
+                count = RssTargetModel.save_changed(targets)
+        except Exception as exc:
+            logging.exception(
+                "Couldn't save the state of the crawled targets: %s", exc
+            )
+        else:
+            logging.debug("Saved the state of %d crawled target(s).", count)
+
+    def _crawl_target(self, target):
+        """Returns the articles extracted from `target` or None on errors."""
+        link = target.link
+        logging.debug(
+            "Crawling target URL %r for articles newer than %s.",
+            link, target.last_modified
+        )
+        target_report = self.report.add_target(target)
+        start = time.perf_counter()
+        try:
+            return self._extract_articles(target, target_report)
+        except Exception as exc:
+            logging.exception("RSS target error with %r: %s", link, exc)
+            target_report.status = "error"
+            target_report.add_error(exc)
+            target.failed()
+            return None
+        finally:
+            target_report.seconds = time.perf_counter() - start
+
+    def _crawl_concurrently(self):
+        """Crawls the targets within a pool of threads, but no more than the allowed
+        number of targets from the same site at once.
+
+        Only a couple of targets per worker are scheduled at a time, so the results
+        don't pile up while the caller is consuming them.
+
+        Yields:
+            tuple: Target index and its crawling result, as soon as it's ready.
+        """
+        by_site = collections.defaultdict(list)
+        for idx, target in enumerate(self._rss_targets):
+            by_site[target.site].append(idx)
+        host_locks = {
+            site: threading.BoundedSemaphore(self._host_workers) for site in by_site
+        }
+        # Alternate the sites, so the workers don't wait after each other on the
+        # same site while the others are idle.
+        order = filter(
+            lambda idx: idx is not None,
+            itertools.chain.from_iterable(itertools.zip_longest(*by_site.values()))
+        )
+
+        def crawl(target):
+            # NOTE(cmiN): Every thread needs its own Datastore context, since the
+            #  targets are updated during the crawl.
+            with host_locks[target.site], get_client().context():
+                return self._crawl_target(target)
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            def submit(count):
+                for idx in itertools.islice(order, count):
+                    pending[executor.submit(crawl, self._rss_targets[idx])] = idx
+
+            pending = {}
+            submit(self._workers * 2)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+                submit(len(done))
@@ -0,0 +1,183 @@
+"""Incremental RSS/Atom feed parsing, reading only as many entries as needed."""
+
+
+import calendar
+import datetime
+import email.utils
+import io
+import itertools
+import logging
+import urllib.parse as urlparse
+
+import feedparser
+from lxml import etree
+
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+RSS1_NS = "http://purl.org/rss/1.0/"
+RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+CONTENT_NS = "http://purl.org/rss/1.0/modules/content/"
+
+# Entry elements by the feed root they belong to.
+ENTRY_TAGS = {
+    "rss": "item",
+    f"{{{RDF_NS}}}RDF": f"{{{RSS1_NS}}}item",
+    f"{{{ATOM_NS}}}feed": f"{{{ATOM_NS}}}entry",
+}
+# Entry fields and the elements providing them, in order of preference.
+FIELD_TAGS = {
+    "title": ["title", f"{{{RSS1_NS}}}title", f"{{{ATOM_NS}}}title"],
+    "summary": [
+        "description", f"{{{RSS1_NS}}}description", f"{{{ATOM_NS}}}summary",
+        f"{{{CONTENT_NS}}}encoded", f"{{{ATOM_NS}}}content",
+    ],
+    "id": ["guid", f"{{{ATOM_NS}}}id"],
+    # NOTE(cmiN): "dc:date" and Atom's "updated" aren't publishing dates for
+    #  `feedparser`, so they aren't either here.
+    "published": ["pubDate", f"{{{ATOM_NS}}}published"],
+}
+LINK_TAGS = ["link", f"{{{RSS1_NS}}}link"]
+ATOM_LINK_TAG = f"{{{ATOM_NS}}}link"
+GUID_TAG = "guid"
+
+
+class UnsupportedFeed(Exception):
+
+    """The feed can't be parsed incrementally."""
+
+
+def _get_text(element):
+    # Markup escaped within the text is kept as it is, like `feedparser` does.
+    return "".join(element.itertext()).strip()
+
+
+def _get_link(entry_element, base):
+    for tag in LINK_TAGS:
+        element = entry_element.find(tag)
+        if element is not None and _get_text(element):
+            return urlparse.urljoin(base, _get_text(element))
+
+    for element in entry_element.iterfind(ATOM_LINK_TAG):
+        if element.get("rel", "alternate") == "alternate" and element.get("href"):
+            return urlparse.urljoin(base, element.get("href"))
+
+    # Permanent GUIDs are links too, when there's no other one.
+    element = entry_element.find(GUID_TAG)
+    if (element is not None and _get_text(element) and
+            element.get("isPermaLink", "true") == "true"):
+        return _get_text(element)
+    return None
+
+
+def _parse_date(value):
+    """Returns the UTC time tuple of a RFC 822 (RSS) or RFC 3339 (Atom) date, the
+    same way `feedparser` does, or None if it can't be parsed.
+    """
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        if value.endswith(("Z", "z")):
+            value = value[:-1] + "+00:00"
+        try:
+            date = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    if not date.tzinfo:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date.utctimetuple()
+
+
+def _parse_entry(entry_element, base):
+    """Returns the fields used by the crawler out of an entry element."""
+    entry = feedparser.FeedParserDict()
+    for field, tags in FIELD_TAGS.items():
+        for tag in tags:
+            element = entry_element.find(tag)
+            if element is not None and _get_text(element):
+                entry[field] = _get_text(element)
+                break
+
+    link = _get_link(entry_element, base)
+    if link:
+        entry["link"] = link
+    # RSS 1.0 items are identified by their resource.
+    about = entry_element.get(f"{{{RDF_NS}}}about")
+    if about and "id" not in entry:
+        entry["id"] = about
+    if "published" in entry:
+        entry["published_parsed"] = _parse_date(entry["published"])
+    return entry
+
+
+def _is_older(entry, since):
+    published = entry.get("published_parsed")
+    return bool(since and published and calendar.timegm(published) <= since)
+
+
+def _iter_entries(content, base):
+    """Yields the entries of the feed as soon as each of them is fully read."""
+    events = etree.iterparse(
+        io.BytesIO(content), events=("start", "end"), resolve_entities=False,
+        no_network=True
+    )
+    entry_tag = None
+    for event, element in events:
+        if entry_tag is None:
+            # The very first element is the root, telling the type of the feed.
+            entry_tag = ENTRY_TAGS.get(element.tag)
+            if not entry_tag:
+                raise UnsupportedFeed(f"unknown feed root {element.tag!r}")
+            continue
+
+        if event == "end" and element.tag == entry_tag:
+            yield _parse_entry(element, base)
+            # Drop the already parsed entries, so the memory doesn't grow with them.
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+def _iter_new_entries(entries, since):
+    count = 0
+    try:
+        for entry in entries:
+            if _is_older(entry, since):
+                continue
+            count += 1
+            yield entry
+    except etree.LxmlError as exc:
+        # Keeps the entries parsed so far out of a broken feed, like `feedparser`.
+        logging.warning("Stopped parsing the broken feed: %s", exc)
+    logging.debug("Incrementally parsed %d feed entries.", count)
+
+
+def parse_feed(content, base=None, since=None):
+    """Parses the feed `content` incrementally, reading its entries only as they
+    get iterated and skipping the ones older than `since`.
+
+    Only the first entry is read right away, telling if the feed is supported, so
+    the caller can stop reading the rest once it has enough of them.
+
+    Args:
+        content (bytes): Raw RSS (0.9x, 1.0 or 2.0) or Atom document.
+        base (str): URL against which the relative entry links are resolved.
+        since (datetime): Skip the entries published before this date.
+    Returns:
+        FeedParserDict: Feed with its (lazily parsed) entries only, the same way
+            `feedparser` returns them.
+    Raises:
+        UnsupportedFeed: When the feed needs the full `feedparser` treatment.
+    """
+    since = since and calendar.timegm(since.utctimetuple())
+    entries = _iter_entries(content, base)
+    try:
+        first_entry = next(entries)
+    except StopIteration:
+        # Possibly a dialect using other elements for its entries.
+        raise UnsupportedFeed("no entries found")
+    except etree.LxmlError as exc:
+        raise UnsupportedFeed(str(exc)) from exc
+
+    entries = _iter_new_entries(itertools.chain([first_entry], entries), since)
+    return feedparser.FeedParserDict(bozo=False, entries=entries)
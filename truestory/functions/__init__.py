@@ -1,4 +1,5 @@
 """Cloud Functions collection using common app logic."""
 
 
+from .cache import get_cached_article, get_cached_articles
 from .parse_article import get_article
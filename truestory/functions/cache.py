@@ -0,0 +1,215 @@
+"""Local cache of the extracted articles, saving repeated downloads and parsing."""
+
+
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import attr
+
+from truestory import settings
+from truestory.functions.parse_article import (
+    _json_serializer, get_article, get_article_details, get_articles
+)
+from truestory.functions.remote import NewsArticleAttr
+
+
+# Lazily inited cache shared by the whole process.
+extraction_cache = None
+# Lazily loaded, since the crawlers use these functions too.
+strip_article_link = None
+
+
+def _get_canonical_link(link):
+    global strip_article_link
+    if not strip_article_link:
+        from truestory.crawlers.common import strip_article_link
+    return strip_article_link(link)
+
+
+class ExtractionCache:
+
+    """SQLite cache of extracted article details by their canonical link.
+
+    Entries expire after `ttl` seconds and only the `size` most recently used ones
+    are kept.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS articles (
+            link TEXT PRIMARY KEY,
+            details TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            used_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS articles_used_at ON articles (used_at);
+    """
+
+    def __init__(self, path, ttl, size):
+        self._ttl = ttl
+        self._size = size
+        # NOTE(cmiN): One connection shared by all the crawling threads, so every
+        #  access is serialized by this lock.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.executescript(self.SCHEMA)
+
+    def get(self, link):
+        """Returns the cached details of `link` or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT details, created_at FROM articles WHERE link = ?", (link,)
+            ).fetchone()
+            if not row:
+                return None
+
+            details, created_at = row
+            if now - created_at >= self._ttl:
+                self._connection.execute(
+                    "DELETE FROM articles WHERE link = ?", (link,)
+                )
+                return None
+
+            self._connection.execute(
+                "UPDATE articles SET used_at = ? WHERE link = ?", (now, link)
+            )
+        return json.loads(details)
+
+    def set(self, links, details):
+        """Caches the same `details` under all the given `links`, then evicts the
+        expired and least recently used entries.
+        """
+        now = time.time()
+        details = json.dumps(details, default=_json_serializer)
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?)",
+                [(link, details, now, now) for link in set(links)]
+            )
+            self._connection.execute(
+                "DELETE FROM articles WHERE created_at <= ?", (now - self._ttl,)
+            )
+            self._connection.execute(
+                """
+                DELETE FROM articles WHERE link IN (
+                    SELECT link FROM articles ORDER BY used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """, (self._size,)
+            )
+
+
+def get_extraction_cache():
+    """Singleton for the extraction cache (None if disabled)."""
+    global extraction_cache
+    if not extraction_cache and settings.EXTRACTION_CACHE_SIZE:
+        extraction_cache = ExtractionCache(
+            settings.EXTRACTION_CACHE_PATH,
+            ttl=datetime.timedelta(days=settings.ARTICLES_MAX_AGE).total_seconds(),
+            size=settings.EXTRACTION_CACHE_SIZE,
+        )
+    return extraction_cache
+
+
+def _open_cache():
+    try:
+        return get_extraction_cache()
+    except sqlite3.Error as exc:
+        logging.warning("Couldn't open the extraction cache: %s", exc)
+        return None
+
+
+def _read_cache(cache, canonical_link, link, use_cache):
+    try:
+        details = cache.get(canonical_link) if cache and use_cache else None
+    except sqlite3.Error as exc:
+        logging.warning("Couldn't read the extraction cache: %s", exc)
+        return None
+    if details:
+        logging.debug("Using cached article details of %r.", link)
+        # Possibly cached through another variant of the same link.
+        details["url"] = link
+        details["stats"] = {"cached": True}
+        return NewsArticleAttr.unpack(details)
+    return None
+
+
+def _write_cache(cache, canonical_link, article):
+    """Caches the freshly extracted `article` and returns its details."""
+    if isinstance(article, NewsArticleAttr):
+        details = attr.asdict(article)
+    else:
+        details = get_article_details(article)
+    # Belonging to this extraction only.
+    stats = details.pop("stats", None) or {}
+    if cache:
+        links = [canonical_link]
+        if article.final_url:
+            links.append(_get_canonical_link(article.final_url))
+        try:
+            cache.set(links, details)
+        except sqlite3.Error as exc:
+            logging.warning("Couldn't update the extraction cache: %s", exc)
+    # Same details whether they come from the cache or not.
+    details = json.loads(json.dumps(details, default=_json_serializer))
+    details["stats"] = stats
+    return NewsArticleAttr.unpack(details)
+
+
+def get_cached_article(link, use_cache=True):
+    """Returns the extracted details of the article found at `link`, downloading
+    and parsing it only if it isn't already cached.
+
+    Args:
+        link (str): Article URL.
+        use_cache (bool): Skip the cache lookup and extract the article again
+            (still updating the cache afterwards).
+    Returns:
+        NewsArticleAttr: Article details, no matter how they were obtained.
+    """
+    canonical_link = _get_canonical_link(link)
+    cache = _open_cache()
+    news_article = _read_cache(cache, canonical_link, link, use_cache)
+    if news_article:
+        return news_article
+
+    return _write_cache(cache, canonical_link, get_article(link))
+
+
+def get_cached_articles(links, use_cache=True, workers=None):
+    """Same as `get_cached_article`, but the articles which aren't cached are
+    extracted at once, by `workers` threads or with a single remote call in
+    production.
+
+    Returns:
+        dict: Article details, or the exception raised while extracting them, by
+            each of the `links`.
+    """
+    cache = _open_cache()
+    canonical_links = {link: _get_canonical_link(link) for link in links}
+    results = {}
+    for link, canonical_link in canonical_links.items():
+        news_article = _read_cache(cache, canonical_link, link, use_cache)
+        if news_article:
+            results[link] = news_article
+
+    missing = [link for link in canonical_links if link not in results]
+    workers_kwargs = {"workers": workers} if workers else {}
+    try:
+        for link, article in get_articles(missing, **workers_kwargs):
+            if not isinstance(article, Exception):
+                article = _write_cache(cache, canonical_links[link], article)
+            results[link] = article
+    except Exception as exc:
+        # The whole batch failed, at least for the links not received yet.
+        for link in missing:
+            results.setdefault(link, exc)
+    for link in missing:
+        results.setdefault(link, LookupError("article not extracted"))
+    return results
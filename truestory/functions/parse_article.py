@@ -1,10 +1,19 @@
 """Handles news article parsing."""
 
 
+import datetime
+import json
 import logging
+import multiprocessing
 import os
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
-from flask import abort, current_app
+import requests
+from flask import Response, abort, current_app, stream_with_context
 from flask_json import FlaskJSON, as_json
 from newspaper import Article as NewsArticle, ArticleException
 
@@ -14,49 +23,220 @@ USER_AGENT = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_6) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/80.0.3987.149 Safari/537.36"
 )
+TIMEOUT = 10  # seconds
+POOL_HOSTS = 64
+POOL_SIZE = 10
+BATCH_SIZE = 50  # maximum links parsed by a single call
+BATCH_WORKERS = 8  # links parsed concurrently within a call
+# Processes parsing the downloaded articles (the downloading threads parse them by
+# themselves if less than 2).
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", os.cpu_count() or 1))
+# NLTK resources bundled with the deploy (`make nltk-data`), downloaded there only
+# if missing.
+NLTK_DATA_DIR = os.getenv(
+    "NLTK_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+)
+# NOTE(cmiN): Newer NLTK versions load the sentence tokenizer from "punkt_tab".
+NLTK_RESOURCES = {"punkt": "tokenizers/punkt", "punkt_tab": "tokenizers/punkt_tab"}
+# Encoding guessed by `requests` when missing, in which case `newspaper` prefers
+# detecting it by itself from the raw content.
+FAIL_ENCODING = "ISO-8859-1"
+
+# NOTE(cmiN): Deployed as a standalone function too, so it can't use the shared
+#  session from `truestory.misc` (lazily created and reused between calls).
+session = None
+# Lazily started pool of parsing processes (False if these can't be used).
+parse_executor = None
+parse_executor_lock = threading.Lock()
+# Parsing resources are loaded once per process.
+warmed_up = False
+warm_up_lock = threading.Lock()
+WARM_UP_LINK = "http://localhost/warm-up"
+WARM_UP_HTML = """
+<html><head><title>Warm up</title></head><body><article>
+<p>Loading the parsing resources once. Then articles are parsed right away.</p>
+</article></body></html>
+"""
 
 if current_app:
     app_json = FlaskJSON(current_app)
-if NLP_ENABLED:
-    import nltk
-    nltk.download("punkt")
 
 
-def get_article(link):
-    GAE_PRODUCTION = os.getenv("GAE_ENV", "").startswith("standard")
-    if GAE_PRODUCTION:
-        # This will not run under Cloud Functions (it is App Engine only).
+def _get_session():
+    global session
+    if not session:
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE
+        )
+        for prefix in ("http://", "https://"):
+            session.mount(prefix, adapter)
+    return session
+
+
+def _is_gae_production():
+    # This will not be true under Cloud Functions (it is App Engine only).
+    return os.getenv("GAE_ENV", "").startswith("standard")
+
+
+def get_article(link, keywords=True):
+    """Downloads and parses the article found at `link`, extracting its keywords
+    (and summary) too if NLP is enabled and `keywords` are needed.
+    """
+    if _is_gae_production():
         from truestory.functions.remote import get_remote_article
-        return get_remote_article(link)
+        return get_remote_article(link, keywords=keywords)
+
+    return _download_article(link, keywords=keywords)
+
 
+def _parse_html(link, html, keywords=True):
+    """Parses the already downloaded `html` of the article found at `link`.
+
+    Returns:
+        dict: Plain article details, as they can be sent between processes.
+    """
     article = NewsArticle(link, browser_user_agent=USER_AGENT)
-    article.download()
+    article.download(input_html=html)
     article.parse()
-    if NLP_ENABLED:
+    if NLP_ENABLED and keywords:
         article.nlp()
-    return article
+    article.final_url = link
+    article.redirects = []
+    return get_article_details(article)
 
 
-@as_json
-def parse_article(request):
-    """Parses a given article `link` and returns its JSON details."""
-    gae_ip = request.headers.get("X-Appengine-User-Ip", "").startswith("2600:1900")
-    internal_country = request.headers.get("X-Appengine-Country") == "ZZ"
-    if not any([gae_ip, internal_country]):
-        abort(403)
+def _load_nlp_resources():
+    import nltk
 
-    data = request.get_json() or request.args
-    link = data.get("link")
-    if not link:
-        abort(400, "Link not supplied.")
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            logging.warning(
+                "Downloading missing NLTK resource %r into %r.", name, NLTK_DATA_DIR
+            )
+            nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True)
 
-    try:
-        article = get_article(link)
-    except ArticleException as exc:
-        logging.exception(exc)
-        abort(404)
 
-    news_article = {
+def warm_up():
+    """Loads the parsing (and NLP) resources of the current process, ahead of the
+    first article.
+    """
+    global warmed_up
+    with warm_up_lock:
+        if warmed_up:
+            return
+
+        start = time.perf_counter()
+        try:
+            if NLP_ENABLED:
+                _load_nlp_resources()
+            _parse_html(WARM_UP_LINK, WARM_UP_HTML)
+        except Exception as exc:
+            # The articles will report the same problem on their own.
+            logging.warning("Couldn't warm up the parsing: %s", exc)
+        warmed_up = True
+    logging.debug("Parsing warmed up in %.3fs.", time.perf_counter() - start)
+
+
+def _get_parse_executor():
+    global parse_executor
+    with parse_executor_lock:
+        if parse_executor is None:
+            parse_executor = False
+            if PARSE_PROCESSES > 1:
+                try:
+                    # NOTE(cmiN): Spawned instead of forked, since the parent is
+                    #  usually running other (crawling) threads.
+                    parse_executor = ProcessPoolExecutor(
+                        max_workers=PARSE_PROCESSES,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        # Every worker is ready before the first article arrives.
+                        initializer=warm_up,
+                    )
+                except (OSError, NotImplementedError) as exc:
+                    logging.warning("Parsing articles within threads: %s", exc)
+    return parse_executor
+
+
+def _parse_article(link, html, keywords=True):
+    """Parses the article within the pool of processes, if available."""
+    global parse_executor
+    executor = _get_parse_executor()
+    if executor:
+        try:
+            return executor.submit(_parse_html, link, html, keywords).result()
+        except BrokenProcessPool as exc:
+            logging.warning("Restarting the parsing processes: %s", exc)
+            with parse_executor_lock:
+                if parse_executor is executor:
+                    parse_executor = None
+    warm_up()
+    return _parse_html(link, html, keywords=keywords)
+
+
+def _download_article(link, keywords=True):
+    start = time.perf_counter()
+    response = _get_session().get(link, timeout=TIMEOUT)
+    response.raise_for_status()
+    html = response.text if response.encoding != FAIL_ENCODING else response.content
+    downloaded = time.perf_counter()
+
+    # Downloaded once in this thread and parsed directly by a CPU bound process,
+    # while keeping the followed redirects.
+    details = _parse_article(link, html, keywords=keywords)
+    details["final_url"] = response.url
+    details["redirects"] = [redirect.url for redirect in response.history]
+    # Time until the response headers of each of the followed redirects.
+    redirecting = sum(
+        redirect.elapsed.total_seconds() for redirect in response.history
+    )
+    details["stats"] = {
+        "download": max(downloaded - start - redirecting, 0.0),
+        "redirects": redirecting,
+        "parse": time.perf_counter() - downloaded,
+        "bytes": len(response.content),
+    }
+    return types.SimpleNamespace(**details)
+
+
+def get_articles(links, workers=BATCH_WORKERS, keywords=True):
+    """Downloads and parses the articles found at `links` concurrently (see
+    `get_article`).
+
+    Yields:
+        tuple: Each link along its article, or the exception raised while getting
+            it, as soon as it's ready.
+    """
+    links = list(dict.fromkeys(links))
+    if not links:
+        return
+
+    if _is_gae_production():
+        from truestory.functions.remote import get_remote_articles
+        yield from get_remote_articles(links, keywords=keywords)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(links))) as executor:
+        futures = {
+            executor.submit(_download_article, link, keywords=keywords): link
+            for link in links
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as exc:
+                yield futures[future], exc
+
+
+def get_article_details(article):
+    """Returns the fields of interest out of a downloaded and parsed `article`."""
+    return {
         "url": article.url,
         "title": article.title,
         "text": article.text,
@@ -65,8 +245,103 @@ def parse_article(request):
         "publish_date": article.publish_date,
         "top_image": article.top_image,
         "keywords": article.keywords,
+        "final_url": article.final_url,
+        "redirects": article.redirects,
+        "stats": getattr(article, "stats", {}),
     }
+
+
+def _json_serializer(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _get_error_status(exc):
+    """Returns the HTTP status telling why the article couldn't be parsed: the one
+    of the failed response, 404 if there's no article and 500 on any other error.
+    """
+    response = getattr(exc, "response", None)
+    if response is not None and response.status_code >= 400:
+        return response.status_code
+    if isinstance(exc, ArticleException):
+        return 404
+    return 500
+
+
+def _iter_parsed_articles(links, keywords=True):
+    """Yields a JSON line for each of the parsed `links`, with either the article
+    details or the error encountered.
+    """
+    for link, article in get_articles(links, keywords=keywords):
+        if isinstance(article, Exception):
+            logging.warning("Couldn't parse article %r: %s", link, article)
+            result = {
+                "link": link,
+                "error": str(article),
+                "type": type(article).__name__,
+                "status": _get_error_status(article),
+            }
+        else:
+            result = {"link": link, "news_article": get_article_details(article)}
+        yield json.dumps(result, default=_json_serializer) + "\n"
+
+
+def _get_flag(data, name, default=True):
+    value = data.get(name)
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() not in ("0", "false", "no")
+    return bool(value)
+
+
+@as_json
+def _parse_single_article(link, keywords=True):
+    try:
+        article = get_article(link, keywords=keywords)
+    except (ArticleException, requests.RequestException) as exc:
+        logging.exception(exc)
+        abort(404)
+
     response = {
-        "news_article": news_article
+        "news_article": get_article_details(article)
     }
     return response
+
+
+def parse_article(request):
+    """Parses a given article `link` and returns its JSON details.
+
+    A list of `links` is parsed concurrently instead, streaming back NDJSON lines
+    (in no particular order) with the "link" and its "news_article" details, or
+    the "error", its exception "type" and "status" of the failed ones.
+
+    The NLP keywords (and summary) aren't extracted if `keywords` is false.
+    """
+    gae_ip = request.headers.get("X-Appengine-User-Ip", "").startswith("2600:1900")
+    internal_country = request.headers.get("X-Appengine-Country") == "ZZ"
+    if not any([gae_ip, internal_country]):
+        abort(403)
+
+    data = request.get_json(silent=True) or request.args
+    keywords = _get_flag(data, "keywords")
+    links = data.getlist("links") if hasattr(data, "getlist") else data.get("links")
+    if links:
+        if len(links) > BATCH_SIZE:
+            abort(400, f"At most {BATCH_SIZE} links can be supplied.")
+        return Response(
+            stream_with_context(_iter_parsed_articles(links, keywords=keywords)),
+            mimetype="application/x-ndjson"
+        )
+
+    link = data.get("link")
+    if not link:
+        abort(400, "Link not supplied.")
+    return _parse_single_article(link, keywords=keywords)
+
+
+# NOTE(cmiN): Loaded on import (cold start), so the first request doesn't pay for
+#  it, while App Engine parses the articles remotely.
+if NLP_ENABLED and not _is_gae_production():
+    warm_up()
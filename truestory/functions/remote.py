@@ -2,13 +2,18 @@
 
 
 import datetime
+import json
+import math
 import re
 from typing import Sequence
 
 import attr
 import cattr
 
-from truestory import misc
+from truestory import misc, settings
+from truestory.functions.parse_article import (
+    BATCH_SIZE, BATCH_WORKERS, TIMEOUT as PARSE_TIMEOUT
+)
 
 
 RE_CLASS_NAME = re.compile(r"[A-Z][a-z\d]*")
@@ -20,6 +25,16 @@ cattr.register_structure_hook(
 )
 
 
+class RemoteError(Exception):
+
+    """Error reported by a remote function for one of the items of a batch."""
+
+    def __init__(self, status, error_type, error):
+        super().__init__(f"{status} {error_type}: {error}")
+        self.status = status
+        self.error_type = error_type
+
+
 class BaseAttr:
 
     FUNCTION_ENDPOINT = None
@@ -44,12 +59,29 @@ class BaseAttr:
         if not cls.FUNCTION_ENDPOINT:
             raise NotImplementedError("missing remote function endpoint")
 
-        session = misc.RequestsSession()
+        session = misc.get_shared_session()
         response = session.get(cls.FUNCTION_ENDPOINT, params=params)
         response.raise_for_status()
         data = response.json()[cls.name()]
         return cls.unpack(data)
 
+    @classmethod
+    def iter_remote(cls, timeout=None, **data):
+        """Posts a batch request to the remote function and yields the JSON results
+        as soon as they're streamed back, waiting for them up to `timeout`.
+        """
+        if not cls.FUNCTION_ENDPOINT:
+            raise NotImplementedError("missing remote function endpoint")
+
+        session = misc.get_shared_session()
+        with session.post(
+                cls.FUNCTION_ENDPOINT, json=data, stream=True,
+                timeout=timeout or settings.TIMEOUT) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
 
 @attr.s
 class NewsArticleAttr(BaseAttr):
@@ -66,7 +98,49 @@ class NewsArticleAttr(BaseAttr):
     publish_date: datetime.datetime = attr.ib()
     top_image: str = attr.ib()
     keywords: Sequence[str] = attr.ib()
-
-
-def get_remote_article(link):
-    return NewsArticleAttr.get_remote(link=link)
+    # URL reached after following the `redirects` (same as `url` if none).
+    final_url: str = attr.ib(default=None)
+    redirects: Sequence[str] = attr.ib(factory=list)
+    # Download and parsing timings (seconds) and size (bytes) of this extraction.
+    stats: dict = attr.ib(factory=dict)
+
+
+def _get_keywords_params(keywords):
+    # Extracted by default, so the usual requests stay the same.
+    return {} if keywords else {"keywords": 0}
+
+
+def get_remote_article(link, keywords=True):
+    return NewsArticleAttr.get_remote(link=link, **_get_keywords_params(keywords))
+
+
+def _get_batch_timeout(count):
+    """Returns the (connect, read) timeout of a batch of `count` links."""
+    # NOTE(cmiN): The streamed results may get buffered until the whole batch is
+    #  parsed, each link taking up to its download timeout and about as much for
+    #  the parsing, `BATCH_WORKERS` of them at once.
+    rounds = math.ceil(count / BATCH_WORKERS)
+    return settings.TIMEOUT, 2 * PARSE_TIMEOUT * rounds + settings.TIMEOUT
+
+
+def get_remote_articles(links, keywords=True):
+    """Parses remotely the articles found at `links`, in batches.
+
+    Yields:
+        tuple: Each link along its article, or the error got instead, in no
+            particular order.
+    """
+    for start in range(0, len(links), BATCH_SIZE):
+        batch = links[start:start + BATCH_SIZE]
+        for result in NewsArticleAttr.iter_remote(
+            timeout=_get_batch_timeout(len(batch)), links=batch,
+            **_get_keywords_params(keywords)
+        ):
+            link = result["link"]
+            if "error" in result:
+                error = RemoteError(
+                    result["status"], result.get("type", "Exception"), result["error"]
+                )
+                yield link, error
+            else:
+                yield link, NewsArticleAttr.unpack(result[NewsArticleAttr.name()])
@@ -6,12 +6,12 @@ import json
 import logging
 import operator
 import re
-import urllib.error as urlerror
-import urllib.request as urlopen
 from datetime import date, datetime
 
+import requests
+
 import truestory
-from truestory import auth, datautil
+from truestory import auth, datautil, misc, settings
 from truestory.crawlers import RssCrawler
 from truestory.models import (
     ArticleModel,
@@ -20,9 +20,9 @@ from truestory.models import (
     get_client,
     ndb_kwargs,
 )
-from truestory.models.base import key_to_urlsafe
+from truestory.models.index import index_articles
 from truestory.settings import SERVER
-from truestory.tasks import pair_article
+from truestory.tasks import rescore_pairs, save_articles, save_crawl_report
 from truestory.tasks.article import shorten_source
 
 
@@ -55,17 +55,25 @@ def crawl_articles(args):
         "Crawling %d targets into Datastore: %s", len(rss_targets), DATASTORE_NAMESPACE
     )
 
-    for rss_target in rss_targets:
-        rss_crawler = RssCrawler([rss_target], limit=args.limit)
-        articles_dict = rss_crawler.crawl_targets()
-        articles = sum(articles_dict.values(), [])
+    rss_crawler = RssCrawler(
+        rss_targets, limit=args.limit, workers=args.workers, refresh=args.refresh
+    )
+
+    def show_articles(articles):
         for article in articles:
             print(json.dumps(article.to_dict(), indent=4, default=_json_serializer))
-        if args.save:
-            logging.info("Saving these %d shown article(s).", len(articles))
-            article_keys = ArticleModel.put_multi(articles)
-            for article_key in article_keys:
-                pair_article(key_to_urlsafe(article_key))
+            yield article
+
+    articles = show_articles(rss_crawler.iter_articles())
+    if args.save:
+        count = save_articles(articles, report=rss_crawler.report)
+        logging.info("Saved these %d shown article(s).", count)
+        crawl_run = save_crawl_report(rss_crawler.report)
+        logging.info("Saved crawling report %s.", crawl_run.urlsafe)
+    else:
+        for _ in articles:
+            pass  # just shown
+    print(rss_crawler.report.format())
 
 
 def compute_token(args):
@@ -131,10 +139,10 @@ def update_rss_targets(args):
 
             if not target.no_redirect_normalization:
                 try:
-                    publisher = RE_PORT.sub(
-                        "", urlopen.urlopen(f"{http}://" + site).url
-                    )
-                except urlerror.HTTPError as exc:
+                    response = misc.get_shared_session().get(f"{http}://" + site)
+                    response.raise_for_status()
+                    publisher = RE_PORT.sub("", response.url)
+                except requests.HTTPError as exc:
                     logging.warning(
                         "Couldn't get redirect publisher from %r (using %r): %s",
                         site, publisher, exc
@@ -212,6 +220,23 @@ def update_sources(args):
     prefs.put()
 
 
+def rebuild_indexes(_):
+    """Re-indexes every article found in the DB (after deploys or Redis flushes)."""
+    articles = ArticleModel.all(order=False)
+    logging.info(
+        "Indexing %d articles from Datastore: %s", len(articles), DATASTORE_NAMESPACE
+    )
+    index_articles(articles)
+
+
+def rescore_bias_pairs(_):
+    """Adds and removes bias pairs based on the stored scores and current
+    thresholds.
+    """
+    result = rescore_pairs()
+    print(f"Added {result['added']} and removed {result['removed']} bias pairs.")
+
+
 def main():
     # Main parser with common flags.
     parser = argparse.ArgumentParser(description="Be your own journalist.")
@@ -239,6 +264,15 @@ def main():
         "-t", "--target", metavar="SOURCE",
         help="choose a specific source name instead of crawling with all of them"
     )
+    crawl_parser.add_argument(
+        "-r", "--refresh", action="store_true",
+        help="crawl the already saved articles again too"
+    )
+    crawl_parser.add_argument(
+        "-w", "--workers", metavar="NUMBER", type=int,
+        default=settings.CRAWL_WORKERS,
+        help=f"how many targets to crawl concurrently ({settings.CRAWL_WORKERS})"
+    )
     crawl_parser.set_defaults(function=crawl_articles)
 
     # RSS targets management.
@@ -277,6 +311,27 @@ def main():
     )
     src_update_parser.set_defaults(function=update_sources)
 
+    # Secondary indexes management.
+    index_parser = subparser.add_parser("index", help="manage article indexes")
+    index_subparser = index_parser.add_subparsers(
+        dest="command", title="commands", required=True
+    )
+    index_rebuild_parser = index_subparser.add_parser(
+        "rebuild", help="re-index all the articles already saved in the database"
+    )
+    index_rebuild_parser.set_defaults(function=rebuild_indexes)
+
+    # Bias pairs management.
+    pair_parser = subparser.add_parser("pair", help="manage bias pairs")
+    pair_subparser = pair_parser.add_subparsers(
+        dest="command", title="commands", required=True
+    )
+    pair_rescore_parser = pair_subparser.add_parser(
+        "rescore",
+        help="apply the current thresholds over the already scored article pairs"
+    )
+    pair_rescore_parser.set_defaults(function=rescore_bias_pairs)
+
     # Token generation (by e-mail) and check.
     token_parser = subparser.add_parser("token", help="compute token")
     token_parser.add_argument(
@@ -1,12 +1,12 @@
 """Miscellaneous."""
 
 
-import urllib.request as urlopen
-
 import redis
 import requests
 
-from truestory.settings import REDIS, USER_AGENT
+from truestory.settings import (
+    HTTP_POOL_HOSTS, HTTP_POOL_SIZE, REDIS, TIMEOUT, USER_AGENT
+)
 
 
 HEADERS = {
@@ -14,6 +14,11 @@ HEADERS = {
 }
 
 
+# Lazily inited clients shared by the whole process.
+redis_client = None
+http_session = None
+
+
 def get_redis_client():
     redis_client = redis.StrictRedis(
         host=REDIS.HOST, port=REDIS.PORT, password=REDIS.PASSWORD
@@ -22,6 +27,14 @@ def get_redis_client():
     return redis_client
 
 
+def get_shared_redis_client():
+    """Singleton for the Redis client (connected on first use)."""
+    global redis_client
+    if not redis_client:
+        redis_client = get_redis_client()
+    return redis_client
+
+
 def get_redis_url():
     if REDIS.PASSWORD:
         auth = f":{REDIS.PASSWORD}@"
@@ -30,14 +43,31 @@ def get_redis_url():
     return f"redis://{auth}{REDIS.HOST}:{REDIS.PORT}"
 
 
-def get_url_opener():
-    opener = urlopen.build_opener()
-    opener.addheaders = list(HEADERS.items())
-    return opener
-
-
 class RequestsSession(requests.Session):
 
-    def __init__(self):
+    """HTTP session with our headers and timeout, keeping alive a pool of
+    connections for each host.
+    """
+
+    def __init__(self, pool_hosts=HTTP_POOL_HOSTS, pool_size=HTTP_POOL_SIZE):
         super().__init__()
         self.headers.update(HEADERS)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_hosts, pool_maxsize=pool_size
+        )
+        for prefix in ("http://", "https://"):
+            self.mount(prefix, adapter)
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", TIMEOUT)
+        return super().request(*args, **kwargs)
+
+
+def get_shared_session():
+    """Singleton for the HTTP session used by the crawlers and remote calls, so the
+    connections (and TLS handshakes) are reused across requests and threads.
+    """
+    global http_session
+    if not http_session:
+        http_session = RequestsSession()
+    return http_session
@@ -1,9 +1,9 @@
 """Here goes all the NDB models for persistent storage."""
 
 
-from .article import ArticleModel, BiasPairModel
+from .article import ArticleCardModel, ArticleModel, BiasPairModel
 from .base import ndb_kwargs, get_client
 from .mail import SubscriberModel
 from .preferences import PreferencesModel
-from .rss import RssTargetModel
+from .rss import CrawlRunModel, RssTargetModel
 from .stats import StatsModel
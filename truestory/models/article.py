@@ -1,11 +1,20 @@
 """Article related models."""
 
 
-import functools
+import hashlib
+import operator
 
+from truestory import settings
 from truestory.models.base import (
-    BaseModel, DateTimeProperty, DuplicateMixin, SideMixin, key_to_urlsafe, ndb
+    BaseModel,
+    DateTimeProperty,
+    DuplicateMixin,
+    SideMixin,
+    key_to_urlsafe,
+    ndb,
+    ndb_kwargs,
 )
+from truestory.models.index import index_articles
 
 
 class ArticleModel(SideMixin, DuplicateMixin, BaseModel):
@@ -22,6 +31,8 @@ class ArticleModel(SideMixin, DuplicateMixin, BaseModel):
     published = DateTimeProperty()
     image = ndb.StringProperty()
     keywords = ndb.StringProperty(repeated=True)
+    # Stripped link of the feed entry, when it redirects to the article `link`.
+    feed_link = ndb.TextProperty(indexed=False)
 
     @staticmethod
     def get_related_articles(main_article_key, meta_func=None):
@@ -70,37 +81,127 @@ class ArticleModel(SideMixin, DuplicateMixin, BaseModel):
     def primary_key(self):
         return "link"
 
+    def put(self):
+        key = super().put()
+        # Otherwise the updated duplicate was already indexed by its own `put`.
+        if key == self.key:
+            index_articles([self])
+        return key
+
+    @classmethod
+    def _post_put_multi_hook(cls, entities):
+        index_articles(entities)
+
+
+class ArticleCardModel(ndb.Model):
+
+    """Article details copied into the bias pairs, enough for rendering them
+    without loading the articles.
+    """
+
+    article = ndb.KeyProperty(kind=ArticleModel)
+    source_name = ndb.StringProperty()
+    link = ndb.StringProperty()
+    title = ndb.StringProperty()
+    summary = ndb.TextProperty()
+    authors = ndb.StringProperty(repeated=True)
+    published = DateTimeProperty()
+    image = ndb.StringProperty()
+    side = ndb.IntegerProperty()
+
+    @classmethod
+    def from_article(cls, article):
+        # One extra character keeps the ellipsis when truncated again on render.
+        summary = (article.summary or article.content or "")
+        summary = summary[:settings.HOME_ARTICLE_MAX_SIZE + 1]
+        return cls(
+            article=article.key,
+            source_name=article.source_name,
+            link=article.link,
+            title=article.title,
+            summary=summary,
+            authors=article.authors,
+            published=article.published,
+            image=article.image,
+            side=article.side,
+        )
+
+    @property
+    def urlsafe(self):
+        return key_to_urlsafe(self.article)
+
 
 class BiasPairModel(BaseModel):
 
-    """A pair of two biased articles."""
+    """A pair of two biased articles.
+
+    Its key is derived from the pair of article keys, so there's only one pair
+    between the same two articles, no matter their order.
+    """
 
     left = ndb.KeyProperty(kind=ArticleModel, required=True)
     right = ndb.KeyProperty(kind=ArticleModel, required=True)
     score = ndb.FloatProperty()
     published = DateTimeProperty()
+    # Denormalized from the articles at creation time.
+    keywords = ndb.StringProperty(repeated=True)
+    left_card = ndb.LocalStructuredProperty(ArticleCardModel)
+    right_card = ndb.LocalStructuredProperty(ArticleCardModel)
 
-    @functools.partial(ndb.ComputedProperty, repeated=True)
-    def keywords(self):
-        """Combines all the keywords into an unique list."""
-        all_keywords = set()
-
-        article_keys = [self.left, self.right]
-        for article_key in article_keys:
-            keywords = article_key.get().keywords or []
-            for keyword in keywords:
-                all_keywords.add(keyword.strip().lower())
+    def __init__(self, *args, **kwargs):
+        left, right = kwargs.get("left"), kwargs.get("right")
+        if left and right and "key" not in kwargs and "id" not in kwargs:
+            kwargs["id"] = self.get_pair_id(left, right)
+        super().__init__(*args, **kwargs)
 
-        return list(filter(None, all_keywords))
+    @staticmethod
+    def get_pair_id(first_key, second_key):
+        """Returns the same ID for both orientations of a pair of article keys."""
+        usafes = sorted(map(key_to_urlsafe, (first_key, second_key)))
+        return hashlib.md5("-".join(usafes).encode(settings.ENCODING)).hexdigest()
+
+    @classmethod
+    def get_between(cls, first_key, second_key):
+        """Returns the pair between two articles (in any orientation) if any."""
+        pair_id = cls.get_pair_id(first_key, second_key)
+        return ndb.Key(cls, pair_id, **ndb_kwargs()).get()
+
+    @classmethod
+    def from_articles(cls, first_article, second_article, score=None):
+        """Creates a pair out of two already loaded articles, ordered by their side.
+        """
+        left_article, right_article = sorted(
+            [first_article, second_article], key=operator.attrgetter("side")
+        )
+        bias_pair = cls(left=left_article.key, right=right_article.key, score=score)
+        bias_pair._denormalize(left_article, right_article)
+        return bias_pair
 
-    def _max_date(self):
+    @staticmethod
+    def get_max_date(left_article, right_article):
         """The newest article establishes the date of the entire pair."""
-        dates = self.left.get().published, self.right.get().published
+        dates = left_article.published, right_article.published
         if all(dates):
             return max(dates)
         return dates[0] or dates[1]
 
+    def _denormalize(self, left_article, right_article):
+        """Copies the details of the paired articles into this pair."""
+        # Combines all the keywords into an unique list.
+        all_keywords = set()
+        for article in (left_article, right_article):
+            for keyword in article.keywords or []:
+                all_keywords.add(keyword.strip().lower())
+        self.keywords = list(filter(None, all_keywords))
+
+        self.published = self.published or self.get_max_date(
+            left_article, right_article
+        )
+        self.left_card = ArticleCardModel.from_article(left_article)
+        self.right_card = ArticleCardModel.from_article(right_article)
+
     def put(self):
-        if not self.exists:
-            self.published = self._max_date()
+        if not (self.left_card and self.right_card):
+            # Pairs not created out of loaded articles have to fetch them first.
+            self._denormalize(*ndb.get_multi([self.left, self.right]))
         return super().put()
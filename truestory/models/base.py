@@ -121,7 +121,20 @@ class BaseModel(ndb.Model):
     @classmethod
     def put_multi(cls, entities):
         """Multiple save in the DB without interfering with the `cls.put` function."""
-        return batch_process(ndb.put_multi, entities)
+        entities = list(entities)
+        keys = batch_process(ndb.put_multi, entities)
+        cls._post_put_multi_hook(entities)
+        return keys
+
+    @classmethod
+    def _post_put_multi_hook(cls, entities):
+        """Called with the just saved `entities` after each `cls.put_multi`."""
+
+    @classmethod
+    def get_multi(cls, keys):
+        """Multiple retrieval of entities based on the given `keys` (skips missing)."""
+        entities = batch_process(ndb.get_multi, keys)
+        return list(filter(None, entities))
 
     def remove(self):
         """Removes current entity and its dependencies (if covered and any)."""
@@ -234,7 +247,6 @@ class SideMixin:
         "Right": RIGHT
     }
     SITE_REPLACE = ["www", "rss", "feeds"]
-    _prefs = None
 
     side = ndb.IntegerProperty(required=True, choices=list(SIDE_MAPPING.values()))
 
@@ -255,12 +267,10 @@ class SideMixin:
 
     @classmethod
     def _get_prefs(cls):
-        if not cls._prefs:
-            global PreferencesModel
-            if not PreferencesModel:
-                from truestory.models.preferences import PreferencesModel
-            cls._prefs = PreferencesModel.instance()
-        return cls._prefs
+        global PreferencesModel
+        if not PreferencesModel:
+            from truestory.models.preferences import PreferencesModel
+        return PreferencesModel.cached()
 
     @classmethod
     def get_site_info(cls, link, site=None):
@@ -0,0 +1,296 @@
+"""Redis backed secondary indexes kept in sync with the Datastore entities."""
+
+
+import json
+
+from truestory import algo, settings
+from truestory.misc import get_shared_redis_client
+from truestory.models.base import key_to_urlsafe, ndb_kwargs
+
+
+def get_redis_prefix(name):
+    """Returns the Redis keys prefix of `name` under the current Datastore
+    namespace.
+    """
+    namespace = ndb_kwargs()["namespace"] or "default"
+    return f"{settings.PROJECT_NAME}:{namespace}:{name}"
+
+
+def _decode(value):
+    return value.decode(settings.ENCODING) if isinstance(value, bytes) else value
+
+
+class RedisIndex:
+
+    """Inverted index mapping terms to the entities containing them.
+
+    Each term is a Redis hash of entity URL safe keys pointing to their JSON
+    metadata, while each indexed entity keeps a set with its own terms, so it can be
+    removed later on without loading it from the Datastore.
+    """
+
+    NAME = None
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_shared_redis_client()
+
+    @property
+    def prefix(self):
+        return get_redis_prefix(self.NAME)
+
+    def _term_key(self, term):
+        return f"{self.prefix}:term:{term}"
+
+    def _entity_key(self, usafe):
+        return f"{self.prefix}:entity:{usafe}"
+
+    @property
+    def _entities_key(self):
+        return f"{self.prefix}:entities"
+
+    def get_terms(self, entity):
+        """Returns the terms under which `entity` is indexed."""
+        raise NotImplementedError(f"{type(self).__name__} terms not specified")
+
+    def get_meta(self, entity):
+        """Returns JSON serializable details stored along the indexed `entity`."""
+        return {}
+
+    def get_entity_terms(self, usafes):
+        """Returns the currently indexed terms of every entity in `usafes`."""
+        pipe = self.client.pipeline(transaction=False)
+        for usafe in usafes:
+            pipe.smembers(self._entity_key(usafe))
+        return {
+            usafe: set(map(_decode, terms))
+            for usafe, terms in zip(usafes, pipe.execute())
+        }
+
+    def add_multi(self, entities):
+        """Indexes (or re-indexes) the already saved `entities`."""
+        entities = [entity for entity in entities if entity.key]
+        if not entities:
+            return
+
+        usafes = [key_to_urlsafe(entity.key) for entity in entities]
+        old_terms = self.get_entity_terms(usafes)
+
+        pipe = self.client.pipeline(transaction=False)
+        for usafe, entity in zip(usafes, entities):
+            terms = set(filter(None, self.get_terms(entity)))
+            meta = json.dumps(self.get_meta(entity))
+            for term in old_terms[usafe] - terms:
+                pipe.hdel(self._term_key(term), usafe)
+            for term in terms:
+                pipe.hset(self._term_key(term), usafe, meta)
+
+            entity_key = self._entity_key(usafe)
+            pipe.delete(entity_key)
+            if terms:
+                pipe.sadd(entity_key, *terms)
+        pipe.sadd(self._entities_key, *usafes)
+        pipe.execute()
+
+    def remove_multi(self, keys):
+        """Drops the entities identified by `keys` from the index."""
+        usafes = [key_to_urlsafe(key) for key in keys]
+        if not usafes:
+            return
+
+        old_terms = self.get_entity_terms(usafes)
+        pipe = self.client.pipeline(transaction=False)
+        for usafe in usafes:
+            for term in old_terms[usafe]:
+                pipe.hdel(self._term_key(term), usafe)
+            pipe.delete(self._entity_key(usafe))
+        pipe.srem(self._entities_key, *usafes)
+        pipe.execute()
+
+    def get_frequencies(self, terms):
+        """Returns how many entities are indexed under each of the `terms`, along the
+        total number of indexed entities (single round trip).
+        """
+        terms = list(set(filter(None, terms)))
+        pipe = self.client.pipeline(transaction=False)
+        for term in terms:
+            pipe.hlen(self._term_key(term))
+        pipe.scard(self._entities_key)
+        *frequencies, total = pipe.execute()
+        return dict(zip(terms, frequencies)), total
+
+    def has_terms(self, terms):
+        """Returns whether each of the `terms` is indexed (single round trip)."""
+        pipe = self.client.pipeline(transaction=False)
+        for term in terms:
+            pipe.exists(self._term_key(term))
+        return [bool(found) for found in pipe.execute()]
+
+    def lookup(self, terms):
+        """Returns the entities indexed under any of the given `terms` with a single
+        round trip.
+
+        Returns:
+            dict: URL safe keys pointing to a dictionary with the stored "meta" and
+                the matched "terms".
+        """
+        terms = list(set(filter(None, terms)))
+        pipe = self.client.pipeline(transaction=False)
+        for term in terms:
+            pipe.hgetall(self._term_key(term))
+
+        hits = {}
+        for term, entries in zip(terms, pipe.execute()):
+            for usafe, meta in entries.items():
+                usafe = _decode(usafe)
+                hit = hits.get(usafe)
+                if not hit:
+                    hit = hits[usafe] = {"meta": json.loads(meta), "terms": set()}
+                hit["terms"].add(term)
+        return hits
+
+
+class KeywordIndex(RedisIndex):
+
+    """Articles by their keywords, used for finding bias pair candidates.
+
+    The size of each keyword's entry is its document frequency, so this doubles as
+    the incrementally maintained IDF table.
+    """
+
+    NAME = "keywords"
+
+    def get_terms(self, entity):
+        return entity.keywords or []
+
+    def get_meta(self, entity):
+        return {"side": entity.side, "source": entity.source_name}
+
+
+class LshIndex(KeywordIndex):
+
+    """Articles by their MinHash LSH band buckets, used for retrieving the likely
+    similar candidates only.
+    """
+
+    NAME = "lsh"
+
+    def get_terms(self, entity):
+        return algo.get_lsh_bands(entity)
+
+
+class LinkIndex(RedisIndex):
+
+    """Articles by their (stripped) link, for skipping the already saved ones
+    before downloading them again.
+
+    The feed entry link is indexed too when it redirects to the article, since
+    that's the only link known before downloading it.
+    """
+
+    NAME = "links"
+
+    def get_terms(self, entity):
+        feed_link = getattr(entity, "feed_link", None)
+        return [entity.link] + ([feed_link] if feed_link else [])
+
+
+class PairScoreStore:
+
+    """Raw score components of every candidate pair scoring above the preferred
+    floor, so the pairs can be filtered again when the thresholds change, without
+    looking up and scoring the candidates once more.
+
+    All the scores live in one Redis hash of pair IDs pointing to their JSON
+    `[first_usafe, second_usafe, contradiction, similarity]`, while each article
+    keeps a set with the IDs of the pairs containing it, for removal.
+    """
+
+    NAME = "scores"
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_shared_redis_client()
+
+    @property
+    def prefix(self):
+        return get_redis_prefix(self.NAME)
+
+    @property
+    def _scores_key(self):
+        return f"{self.prefix}:pairs"
+
+    def _article_key(self, usafe):
+        return f"{self.prefix}:article:{usafe}"
+
+    def add_multi(self, scores):
+        """Stores (or updates) the given `scores`.
+
+        Args:
+            scores (dict): Pair IDs pointing to a tuple of (first_key, second_key,
+                contradiction, similarity).
+        """
+        if not scores:
+            return
+
+        pipe = self.client.pipeline(transaction=False)
+        for pair_id, (first_key, second_key, *components) in scores.items():
+            usafes = [key_to_urlsafe(first_key), key_to_urlsafe(second_key)]
+            pipe.hset(self._scores_key, pair_id, json.dumps(usafes + components))
+            for usafe in usafes:
+                pipe.sadd(self._article_key(usafe), pair_id)
+        pipe.execute()
+
+    def iterate(self):
+        """Yields (pair_id, first_usafe, second_usafe, contradiction, similarity)
+        tuples for all the stored pairs.
+        """
+        for pair_id, value in self.client.hscan_iter(self._scores_key, count=1000):
+            yield (_decode(pair_id), *json.loads(value))
+
+    def remove_articles(self, article_keys):
+        """Drops the scores of all the pairs containing any of the given articles.
+        """
+        usafes = [key_to_urlsafe(key) for key in article_keys]
+        if not usafes:
+            return
+
+        pipe = self.client.pipeline(transaction=False)
+        for usafe in usafes:
+            pipe.smembers(self._article_key(usafe))
+        pair_ids = set()
+        for ids in pipe.execute():
+            pair_ids.update(map(_decode, ids))
+
+        # NOTE(cmiN): The sets of the other articles within these pairs may still
+        #  point to the removed scores, which is harmless and gets cleaned up along
+        #  them.
+        if pair_ids:
+            pipe.hdel(self._scores_key, *pair_ids)
+        pipe.delete(*map(self._article_key, usafes))
+        pipe.execute()
+
+
+keyword_index = KeywordIndex()
+lsh_index = LshIndex()
+link_index = LinkIndex()
+article_indexes = [keyword_index, lsh_index, link_index]
+pair_scores = PairScoreStore()
+
+
+def index_articles(articles):
+    """Adds the saved `articles` to all the article indexes."""
+    for index in article_indexes:
+        index.add_multi(articles)
+
+
+def unindex_articles(article_keys):
+    """Removes the articles identified by `article_keys` from all the indexes."""
+    for index in article_indexes:
+        index.remove_multi(article_keys)
@@ -1,13 +1,90 @@
 """Global admin settings, options and preferences."""
 
 
+import logging
+import time
+
+from truestory import settings
+from truestory.misc import get_shared_redis_client
 from truestory.models.base import BaseModel, SingletonMixin, ndb
+from truestory.models.index import get_redis_prefix
 
 
 class PreferencesModel(SingletonMixin, BaseModel):
 
     """Singleton preferences and resources model."""
 
+    # Process wide cached instance and the time it was last validated.
+    _cached = None
+    _cached_at = 0
+
     sites = ndb.JsonProperty(default={})
     contradiction_threshold = ndb.FloatProperty(default=0.5)
     similarity_threshold = ndb.FloatProperty(default=0.5)
+    # LSH candidates retrieval: more bands raise the recall, more rows the precision
+    # (zero bands fall back to keyword matching). Changes require re-indexing, then
+    # 64 bands of 2 rows still find ~99% of the pairs above a 0.5 similarity.
+    lsh_bands = ndb.IntegerProperty(default=0)
+    lsh_rows = ndb.IntegerProperty(default=2)
+    # Weight the shared keywords by their IDF and skip the candidates sharing less
+    # (weighted) keywords than the floor with the paired article.
+    idf_weighting = ndb.BooleanProperty(default=False)
+    idf_floor = ndb.FloatProperty(default=2.0)
+    # Score components of the candidate pairs reaching this floor are stored, so
+    # the thresholds above can be changed down to it without pairing again.
+    score_floor = ndb.FloatProperty(default=0.2)
+    # Incremented on every save, so the cached instances know when to reload.
+    version = ndb.IntegerProperty(default=0)
+
+    @staticmethod
+    def _version_key():
+        return f"{get_redis_prefix('preferences')}:version"
+
+    @classmethod
+    def _get_saved_version(cls):
+        version = get_shared_redis_client().get(cls._version_key())
+        return int(version) if version is not None else None
+
+    @classmethod
+    def _set_saved_version(cls, version):
+        get_shared_redis_client().set(cls._version_key(), version)
+
+    def put(self):
+        self.version = (self.version or 0) + 1
+        key = super().put()
+        self._set_saved_version(self.version)
+        cls = type(self)
+        cls._cached, cls._cached_at = self, time.monotonic()
+        return key
+
+    @classmethod
+    def cached(cls):
+        """Returns the preferences shared by the whole process.
+
+        The instance is loaded once, then every `settings.PREFERENCES_TTL` seconds
+        its version is compared with the latest saved one (in Redis) and it gets
+        reloaded only if they differ.
+        """
+        now = time.monotonic()
+        if cls._cached and now - cls._cached_at < settings.PREFERENCES_TTL:
+            return cls._cached
+
+        if cls._cached:
+            try:
+                saved_version = cls._get_saved_version()
+            except Exception as exc:
+                logging.warning("Couldn't check the preferences version: %s", exc)
+                saved_version = None
+            if saved_version == cls._cached.version:
+                cls._cached_at = now
+                return cls._cached
+
+        logging.debug("Loading preferences from the Datastore.")
+        prefs = cls.instance()
+        cls._cached, cls._cached_at = prefs, now
+        try:
+            if cls._get_saved_version() is None:
+                cls._set_saved_version(prefs.version)
+        except Exception as exc:
+            logging.warning("Couldn't save the preferences version: %s", exc)
+        return prefs
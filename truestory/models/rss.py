@@ -1,6 +1,9 @@
 """RSS related models."""
 
 
+import datetime
+
+from truestory import settings
 from truestory.models.base import BaseModel, DateTimeProperty, SideMixin, ndb
 
 
@@ -18,27 +21,149 @@ class RssTargetModel(SideMixin, BaseModel):
     auth_required = ndb.BooleanProperty(default=False)
     enabled = ndb.BooleanProperty(default=True)
 
-    def checkpoint(self, modified, etag):
+    # Crawling schedule adapted to the observed publication rate (new articles per
+    # hour) and backed off while nothing new shows up.
+    rate = ndb.FloatProperty(default=0.0)
+    unchanged = ndb.IntegerProperty(default=0)
+    crawled_at = DateTimeProperty()
+    next_crawl = DateTimeProperty()
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def is_due(self, now=None):
+        """Tells if the target should be crawled on the current scheduling tick."""
+        if not self.next_crawl:
+            return True
+
+        now = now or self._now()
+        # Targets due until the middle of the next tick are crawled on this one.
+        slack = datetime.timedelta(hours=settings.CRAWL_MIN_INTERVAL / 2)
+        return self.next_crawl <= now + slack
+
+    def _reschedule(self, new_count):
+        """Updates the publication rate with the `new_count` articles found since
+        the previous crawl and plans the next one accordingly.
+        """
+        now = self._now()
+        if self.crawled_at:
+            hours = (now - self.crawled_at).total_seconds() / 3600
+            observed = new_count / max(hours, settings.CRAWL_MIN_INTERVAL)
+            smoothing = settings.CRAWL_RATE_SMOOTHING
+            self.rate = smoothing * observed + (1 - smoothing) * (self.rate or 0.0)
+        self.unchanged = 0 if new_count else (self.unchanged or 0) + 1
+        self.crawled_at = now
+        self._plan_next_crawl(now)
+
+    def _plan_next_crawl(self, now):
+        if self.rate:
+            interval = settings.CRAWL_EXPECTED_ENTRIES / self.rate
+        else:
+            interval = settings.CRAWL_MIN_INTERVAL
+        # Feeds which keep having nothing new are polled less and less often.
+        interval *= 2 ** self.unchanged
+        interval = min(
+            max(interval, settings.CRAWL_MIN_INTERVAL), settings.CRAWL_MAX_INTERVAL
+        )
+        self.next_crawl = now + datetime.timedelta(hours=interval)
+
+    def _back_off(self):
+        # Nothing retrieved to learn the publication rate from, so the failing
+        # feeds are just polled less and less often.
+        self.unchanged = (self.unchanged or 0) + 1
+        self._plan_next_crawl(self._now())
+
+    @property
+    def changed(self):
+        """Tells if the crawling state was updated since the last save."""
+        return getattr(self, "_state_changed", False)
+
+    def _mark_changed(self):
+        # NOTE(cmiN): Saved by the crawler along the other crawled targets (with
+        #  `put_multi`), instead of a write for each update.
+        self._state_changed = True
+
+    def _post_put_hook(self, future):
+        self._state_changed = False
+
+    def checkpoint(self, modified, etag, new_count=0):
         """Called after each successful crawl in order to know from where to start
-        next time.
+        next time and when.
         """
         self.last_modified = modified
         self.etag = etag
-        self.put()
+        self._reschedule(new_count)
+        self._mark_changed()
+
+    def not_modified(self):
+        """Called when the feed has nothing new since the last crawl."""
+        self._reschedule(0)
+        self._mark_changed()
+
+    def failed(self):
+        """Called when the crawl fails, in order to retry later and later."""
+        self._back_off()
+        self._mark_changed()
 
     def has_gone(self):
         """Marks this feed as dead; do not crawl it again."""
         self.gone = True
-        self.put()
+        self._back_off()
+        self._mark_changed()
 
     def needs_auth(self):
         """Marks this feed with required authentication in order to skip it if auth is
         not supported.
         """
         self.auth_required = True
-        self.put()
+        self._back_off()
+        self._mark_changed()
 
     def moved_to(self, link):
-        """Saves the new address when the target URL permanently moves."""
+        """Updates the address when the target URL permanently moves."""
         self.link = link
-        self.put()
+        self._mark_changed()
+
+    @classmethod
+    def save_changed(cls, targets):
+        """Saves at once the `targets` whose crawling state changed.
+
+        Returns:
+            int: How many targets were saved.
+        """
+        changed = [target for target in targets if target.changed]
+        if changed:
+            cls.put_multi(changed)
+        return len(changed)
+
+
+class CrawlRunModel(BaseModel):
+
+    """Report of a crawling run, with its per target and per stage breakdown.
+
+    A cron tick crawls its due targets in chunks, one run (task) each, all of them
+    sharing the same `tick`.
+    """
+
+    tick = DateTimeProperty()
+    seconds = ndb.FloatProperty()
+    targets = ndb.IntegerProperty(default=0)
+    articles = ndb.IntegerProperty(default=0)
+    errors = ndb.IntegerProperty(default=0)
+    report = ndb.JsonProperty(compressed=True)
+
+    @classmethod
+    def from_report(cls, crawl_report, tick=None):
+        """Creates the record of the given finished `CrawlReport`, started by the
+        cron `tick` (if any).
+        """
+        report = crawl_report.to_dict()
+        return cls(
+            tick=tick,
+            seconds=report["seconds"],
+            targets=len(report["targets"]),
+            articles=report["counts"].get("articles", 0),
+            errors=sum(report["errors"].values()),
+            report=report,
+        )
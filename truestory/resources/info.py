@@ -7,10 +7,6 @@ from truestory.models import PreferencesModel, RssTargetModel
 from truestory.resources import base
 
 
-# Lazily inited.
-prefs = None
-
-
 class BaseInfoResource(base.BaseResource):
 
     """Base class for all info related resources."""
@@ -24,20 +20,13 @@ class SitesInfoResource(BaseInfoResource):
 
     ENDPOINT = "sites"
 
-    @staticmethod
-    def _get_prefs():
-        global prefs
-        if not prefs:
-            prefs = PreferencesModel.instance()
-        return prefs
-
     def get(self):
         """Returns a list of accepted trusted sources (news websites)."""
         enabled_targets = RssTargetModel.all(
             RssTargetModel.query(RssTargetModel.enabled == True)
         )
         crawled_sites = {target.site for target in enabled_targets}
-        prefs = self._get_prefs()
+        prefs = PreferencesModel.cached()
         head_list, tail_list = [], []
 
         for site, details in prefs.sites.items():
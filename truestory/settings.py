@@ -2,6 +2,7 @@
 
 
 import os
+import tempfile
 
 
 # Server environment and application settings.
@@ -25,6 +26,19 @@ class SERVER:
 
 # Miscellaneous.
 TIMEOUT = 10  # seconds
+HTTP_POOL_HOSTS = 64  # hosts with kept alive connections
+HTTP_POOL_SIZE = 10  # kept alive connections per host
+CRAWL_WORKERS = 8  # targets crawled concurrently
+CRAWL_HOST_WORKERS = 2  # concurrent crawls of targets from the same site
+CRAWL_ENTRY_WORKERS = 4  # articles extracted concurrently within a target
+CRAWL_TASK_TARGETS = 50  # due targets crawled (concurrently) by a single task
+# Adaptive crawling schedule of each target, based on its publication rate.
+CRAWL_MIN_INTERVAL = 1  # hours (same as the crawling cron)
+CRAWL_MAX_INTERVAL = 24  # hours
+CRAWL_EXPECTED_ENTRIES = 5  # new articles expected between crawls
+CRAWL_RATE_SMOOTHING = 0.3  # weight of the latest observed rate
+CRAWL_REPORTS_MAX_AGE = 7  # days of kept crawling run reports
+PREFERENCES_TTL = 60  # seconds until checking for newer preferences
 ENCODING = "utf-8"
 DEFAULT_MAIL = "hello@truestory.one"
 PROJECT_NAME = PROJECT_ID
@@ -38,6 +52,14 @@ FULL_ARTICLE_MAX_SIZE = 1024
 AUTHORS_MAX_SIZE = 64
 API_MAX_RELATED_ARTICLES = 3
 
+# Articles lifetime and the local cache of their extracted details.
+ARTICLES_MAX_AGE = 2  # as days
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), f"{PROJECT_NAME}-articles.sqlite3")
+)
+EXTRACTION_CACHE_SIZE = 5000  # articles (0 disables the cache)
+
 
 # Misc.
 class REDIS:
@@ -1,4 +1,12 @@
 """Tasks deferred outside the request context."""
 
 
-from .article import clean_articles, crawl_articles, pair_article
+from .article import (
+    clean_articles,
+    crawl_articles,
+    pair_article,
+    pair_articles,
+    rescore_pairs,
+    save_articles,
+    save_crawl_report,
+)
@@ -1,52 +1,115 @@
 """Article and bias pair related tasks."""
 
 
+import contextlib
 import datetime
+import itertools
 import logging
-import operator
 
-import redis_lock
-
-from truestory import algo
+from truestory import algo, settings
 from truestory.crawlers import RssCrawler
-from truestory.misc import get_redis_client
-from truestory.models import ArticleModel, BiasPairModel, RssTargetModel
+from truestory.models import (
+    ArticleModel, BiasPairModel, CrawlRunModel, PreferencesModel, RssTargetModel
+)
 from truestory.models.base import key_to_urlsafe, urlsafe_to_key
+from truestory.models.index import (
+    keyword_index, lsh_index, pair_scores, unindex_articles
+)
 from truestory.tasks.util import create_task
 
 
 ARTICLES_PER_TARGET = 10
-ARTICLES_MAX_AGE = 2  # as days
+SAVE_CHUNK_SIZE = 50  # articles saved and paired at once
 
 shorten_source = lambda src_name: src_name.split("-")[0].strip()
-redis_client = get_redis_client()
+
+
+def save_articles(articles, chunk_size=SAVE_CHUNK_SIZE, report=None):
+    """Saves the (streamed) `articles` in chunks, handing each saved chunk to
+    pairing right away.
+
+    The time spent saving and handing over to pairing (just enqueuing the pairing
+    task when deployed) is measured into the crawling `report`, if given. A chunk
+    failing to be saved or paired is logged and the next ones are saved still.
+
+    Returns:
+        int: How many articles were saved.
+    """
+    stage = report.stage if report else lambda _: contextlib.nullcontext()
+    count = 0
+    articles = iter(articles)
+    while True:
+        chunk = list(itertools.islice(articles, chunk_size))
+        if not chunk:
+            break
+
+        logging.info("Saving %d articles into DB.", len(chunk))
+        try:
+            with stage("articles_save"):
+                article_keys = ArticleModel.put_multi(chunk)
+        except Exception as exc:
+            logging.exception("Couldn't save %d articles: %s", len(chunk), exc)
+            continue
+
+        count += len(chunk)
+        if not article_keys:
+            continue
+
+        try:
+            with stage("pairing_enqueue"):
+                pair_articles(list(map(key_to_urlsafe, article_keys)))
+        except Exception as exc:
+            logging.exception(
+                "Couldn't pair %d saved articles: %s", len(article_keys), exc
+            )
+    return count
+
+
+def save_crawl_report(crawl_report, tick=None):
+    """Persists the finished crawling run report and returns its record."""
+    crawl_run = CrawlRunModel.from_report(crawl_report, tick=tick)
+    crawl_run.put()
+    return crawl_run
 
 
 @create_task("crawl-queue")
-def _crawl_articles(rss_target_usafe):
-    rss_target = RssTargetModel.get(rss_target_usafe)
-    rss_crawler = RssCrawler([rss_target], limit=ARTICLES_PER_TARGET)
-    articles_dict = rss_crawler.crawl_targets()
-    articles = sum(articles_dict.values(), [])
-    count = len(articles)
-    logging.info("Saving %d articles into DB.", count)
-    article_keys = ArticleModel.put_multi(articles)
-    for article_key in article_keys:
-        pair_article(key_to_urlsafe(article_key))
-    return {"articles": count}
+def _crawl_articles(rss_target_usafes, tick=None):
+    target_keys = list(map(urlsafe_to_key, rss_target_usafes))
+    rss_targets = RssTargetModel.get_multi(target_keys)
+    rss_crawler = RssCrawler(rss_targets, limit=ARTICLES_PER_TARGET)
+    count = save_articles(rss_crawler.iter_articles(), report=rss_crawler.report)
+    tick = tick and datetime.datetime.fromisoformat(tick)
+    crawl_run = save_crawl_report(rss_crawler.report, tick=tick)
+    logging.info("Crawling report:\n%s", rss_crawler.report.format())
+    return {"articles": count, "crawl_run": crawl_run.urlsafe}
 
 
 def crawl_articles():
-    """Crawls and saves new articles in the DB."""
-    rss_target_keys = RssTargetModel.all(
-        RssTargetModel.query(RssTargetModel.enabled == True),
-        keys_only=True
+    """Crawls and saves new articles in the DB, from the targets due to be crawled
+    according to their publication rate.
+
+    The due targets are crawled concurrently in chunks, one task each, so their
+    state and crawling report get saved once per chunk.
+    """
+    # The dead and the unauthorized feeds aren't crawled anymore.
+    rss_query = RssTargetModel.query(
+        RssTargetModel.enabled == True,
+        RssTargetModel.gone == False,
+        RssTargetModel.auth_required == False,
+    )
+    rss_targets = RssTargetModel.all(rss_query, order=False)
+    due_targets = [target for target in rss_targets if target.is_due()]
+    count = len(due_targets)
+    logging.info(
+        "Starting crawling with %d due targets out of %d.", count, len(rss_targets)
     )
-    count = len(rss_target_keys)
-    logging.info("Starting crawling with %d targets.", count)
-    for rss_target_key in rss_target_keys:
-        _crawl_articles(key_to_urlsafe(rss_target_key))
-    return {"targets": count}
+    tick = datetime.datetime.utcnow().isoformat()
+    tasks_count = 0
+    for start in range(0, count, settings.CRAWL_TASK_TARGETS):
+        chunk = due_targets[start:start + settings.CRAWL_TASK_TARGETS]
+        _crawl_articles([key_to_urlsafe(target.key) for target in chunk], tick=tick)
+        tasks_count += 1
+    return {"targets": count, "tasks": tasks_count}
 
 
 def _get_matching_keys(*query_filters_list, model):
@@ -80,7 +143,7 @@ def _clean_article_biases(article_usafe):
 
 def clean_articles():
     """Cleans all outdated articles."""
-    delta = datetime.timedelta(days=ARTICLES_MAX_AGE)
+    delta = datetime.timedelta(days=settings.ARTICLES_MAX_AGE)
     min_date = datetime.datetime.utcnow() - delta
     logging.info("Collecting articles older than %s for removal...", min_date)
 
@@ -95,8 +158,214 @@ def clean_articles():
 
     articles_count = len(article_keys)
     logging.info("Removing %d articles.", articles_count)
+    # Every indexed link goes too (feed entry ones included), as tracked by the
+    # indexes themselves.
+    unindex_articles(article_keys)
+    pair_scores.remove_articles(article_keys)
     ArticleModel.remove_multi(article_keys)
-    return {"articles": articles_count}
+
+    delta = datetime.timedelta(days=settings.CRAWL_REPORTS_MAX_AGE)
+    crawl_run_keys = CrawlRunModel.all(
+        CrawlRunModel.query(
+            CrawlRunModel.created_at < datetime.datetime.utcnow() - delta
+        ),
+        keys_only=True, order=False
+    )
+    logging.info("Removing %d crawling reports.", len(crawl_run_keys))
+    CrawlRunModel.remove_multi(crawl_run_keys)
+    return {"articles": articles_count, "crawl_runs": len(crawl_run_keys)}
+
+
+def _lookup_candidates(main_articles):
+    """Returns the indexed articles which might pair with any of `main_articles`.
+
+    The LSH buckets give the likely similar ones only, while the keyword index gives
+    every article sharing at least one keyword (used when LSH is disabled).
+    """
+    if PreferencesModel.cached().lsh_bands:
+        index, get_terms = lsh_index, algo.get_lsh_bands
+    else:
+        index, get_terms = keyword_index, lambda article: article.keywords or []
+
+    terms = set()
+    for main_article in main_articles:
+        terms.update(get_terms(main_article))
+    return index.lookup(terms)
+
+
+def _get_idf(articles):
+    """Returns the IDF table of all the keywords within `articles` (if enabled)."""
+    if not PreferencesModel.cached().idf_weighting:
+        return None
+
+    keywords = set()
+    for article in articles:
+        keywords.update(article.keywords or [])
+    return algo.get_idf(*keyword_index.get_frequencies(keywords))
+
+
+def _drop_uninformative(hits, idf):
+    """Drops the keyword index `hits` sharing less IDF weighted keywords than the
+    preferred floor with all the main articles, before loading them.
+
+    The matched terms of a hit are the keywords shared with any of the main
+    articles, so their weight bounds the one shared with each of them and no
+    candidate kept by the scoring gets dropped here.
+    """
+    floor = PreferencesModel.cached().idf_floor
+    default = max(idf.values(), default=1.0)
+    informative = {
+        usafe: hit for usafe, hit in hits.items()
+        if sum(idf.get(term, default) for term in hit["terms"]) >= floor
+    }
+    logging.debug(
+        "Skipping %d candidates sharing too little information.",
+        len(hits) - len(informative)
+    )
+    return informative
+
+
+def _drop_same_source(hits, main_sources):
+    """Drops the `hits` coming from the same source as all the main articles (out
+    of their indexed metadata), since they can't pair with any of them.
+    """
+    different = {
+        usafe: hit for usafe, hit in hits.items()
+        if main_sources - {shorten_source(hit["meta"].get("source") or "")}
+    }
+    logging.debug(
+        "Skipping %d candidates from the same source.", len(hits) - len(different)
+    )
+    return different
+
+
+def _pair_articles(main_articles):
+    """Creates bias pairs between the `main_articles` and every related article,
+    reading the candidates and writing the pairs in batches.
+    """
+    for main_article in main_articles:
+        assert main_article.side is not None, (
+            "attempted to pair article with missing side"
+        )
+
+    hits = _lookup_candidates(main_articles)
+    idf = _get_idf(main_articles)
+    # NOTE(cmiN): LSH hits are matched by their buckets instead of keywords, but
+    #  they're the likely similar candidates already.
+    if idf is not None and not PreferencesModel.cached().lsh_bands:
+        hits = _drop_uninformative(hits, idf)
+    main_sources = [shorten_source(main.source_name) for main in main_articles]
+    hits = _drop_same_source(hits, set(main_sources))
+
+    candidate_keys = []
+    for usafe, candidate in hits.items():
+        if candidate["meta"]["side"] is None:
+            logging.warning(
+                "Skipping related article %r because its side is missing.", usafe
+            )
+            continue
+        candidate_keys.append(urlsafe_to_key(usafe))
+    candidates = ArticleModel.get_multi(candidate_keys)
+    if idf is not None:
+        idf.update(_get_idf(candidates))
+    scores = algo.score_pairs(main_articles, candidates, idf=idf)
+
+    prefs = PreferencesModel.cached()
+    stored = (
+        (scores.contradiction >= prefs.score_floor) &
+        (scores.similarity >= prefs.score_floor)
+    ) | scores.mask
+    candidate_sources = [shorten_source(article.source_name) for article in candidates]
+    # Unique pairs of articles (by link), since the main articles may pair between
+    # themselves too.
+    pairs = {}
+    components = {}
+    for row, col in zip(*stored.nonzero()):
+        main_article, article = main_articles[row], candidates[col]
+        if main_sources[row] == candidate_sources[col]:
+            continue
+        if main_article.link == article.link:
+            continue
+
+        pair_id = BiasPairModel.get_pair_id(main_article.key, article.key)
+        components[pair_id] = (
+            main_article.key, article.key,
+            float(scores.contradiction[row, col]), float(scores.similarity[row, col])
+        )
+        if scores.mask[row, col]:
+            links = frozenset([main_article.link, article.link])
+            pairs[links] = (main_article, article, float(scores.score[row, col]))
+    logging.debug(
+        "Skipping %d potential pairs because their score is too low.",
+        scores.mask.size - scores.mask.sum()
+    )
+    pair_scores.add_multi(components)
+
+    # NOTE(cmiN): Pairs have keys derived from their articles, so saving them again
+    #  just overwrites the previous ones (no duplicates, nor locking needed).
+    bias_pairs = []
+    for main_article, article, score in pairs.values():
+        bias_pair = BiasPairModel.from_articles(main_article, article, score=score)
+        logging.info(
+            "Adding new bias pair with score %f between %r and %r.",
+            score, bias_pair.left_card.link, bias_pair.right_card.link
+        )
+        bias_pairs.append(bias_pair)
+    BiasPairModel.put_multi(bias_pairs)
+    return {"bias_pairs": len(bias_pairs)}
+
+
+def rescore_pairs():
+    """Creates and removes bias pairs according to the current thresholds, using
+    the stored score components only (no candidates lookup nor scoring).
+
+    Pairs without stored scores (created before storing them) are left untouched.
+    """
+    prefs = PreferencesModel.cached()
+    thresholds = prefs.contradiction_threshold, prefs.similarity_threshold
+    if min(thresholds) < prefs.score_floor:
+        logging.warning(
+            "Thresholds below the score floor (%f) miss the pairs scoring under it.",
+            prefs.score_floor
+        )
+
+    passing, failing = {}, set()
+    for pair_id, *usafes, contradiction, similarity in pair_scores.iterate():
+        if (contradiction >= prefs.contradiction_threshold and
+                similarity >= prefs.similarity_threshold):
+            passing[pair_id] = (usafes, (contradiction + similarity) / 2)
+        else:
+            failing.add(pair_id)
+
+    existing = {
+        key.id(): key for key in BiasPairModel.all(keys_only=True, order=False)
+    }
+    removed_keys = [existing[pair_id] for pair_id in failing & existing.keys()]
+    logging.info("Removing %d bias pairs below the thresholds.", len(removed_keys))
+    BiasPairModel.remove_multi(removed_keys)
+
+    added = {
+        pair_id: value for pair_id, value in passing.items()
+        if pair_id not in existing
+    }
+    article_keys = {
+        urlsafe_to_key(usafe) for usafes, _ in added.values() for usafe in usafes
+    }
+    articles = {
+        key_to_urlsafe(article.key): article
+        for article in ArticleModel.get_multi(list(article_keys))
+    }
+    bias_pairs = []
+    for usafes, score in added.values():
+        if not all(usafe in articles for usafe in usafes):
+            continue  # removed in the meantime
+        first_article, second_article = (articles[usafe] for usafe in usafes)
+        bias_pairs.append(
+            BiasPairModel.from_articles(first_article, second_article, score=score)
+        )
+    logging.info("Adding %d bias pairs above the thresholds.", len(bias_pairs))
+    BiasPairModel.put_multi(bias_pairs)
+    return {"added": len(bias_pairs), "removed": len(removed_keys)}
 
 
 @create_task("bias-queue")
@@ -110,69 +379,22 @@ def pair_article(article_usafe):
         logging.exception(exc)
         return {"bias_pairs": 0}
 
-    assert main_article.side is not None, "attempted to pair article with missing side"
-
-    main_source_name = shorten_source(main_article.source_name)
-    related_articles = {}
-
-    if main_article.keywords:
-        article_query = ArticleModel.query(
-            ArticleModel.keywords.IN(main_article.keywords)
-        )
-        articles = ArticleModel.all(article_query, order=False)
-    else:
-        articles = []
+    return _pair_articles([main_article])
 
-    for article in articles:
-        if shorten_source(article.source_name) != main_source_name:
-            related_articles[article.link] = article
 
-    related_articles.pop(main_article.link, None)
-    for link, article in list(related_articles.items()):
-        if article.side is None:
-            logging.warning(
-                "Skipping related article %r because its side is missing.", link
-            )
-            del related_articles[link]
-
-    added_pairs = 0
-    for article in related_articles.values():
-        must_save, score = algo.get_bias_score(main_article, article)
-        if not must_save:
-            logging.debug(
-                "Skipping potential pair article %r because score is too low.",
-                article.link
-            )
-            continue
-
-        query_filters_list = [
-            (BiasPairModel.left == main_article.key,
-             BiasPairModel.right == article.key),
-            (BiasPairModel.left == article.key,
-             BiasPairModel.right == main_article.key),
-        ]
-        lock_name = "-".join(sorted(
-            map(key_to_urlsafe, [main_article.key, article.key])
-        ))
-
-        with redis_lock.Lock(redis_client, lock_name):
-            bias_pair_keys = _get_matching_keys(
-                *query_filters_list, model=BiasPairModel
-            )
-            if bias_pair_keys:
-                logging.info(
-                    "Removing %d duplicate bias pairs first.", len(bias_pair_keys)
-                )
-                BiasPairModel.remove_multi(bias_pair_keys)
-
-            articles = sorted([main_article, article], key=operator.attrgetter("side"))
-            logging.info(
-                "Adding new bias pair with score %f between %r and %r.",
-                score, articles[0].link, articles[1].link
-            )
-            BiasPairModel(
-                left=articles[0].key, right=articles[1].key, score=score
-            ).put()
-            added_pairs += 1
+@create_task("bias-queue")
+def pair_articles(article_usafes):
+    """Creates bias pairs for a batch of articles (like the ones saved after a
+    crawl) at once.
+    """
+    article_keys = list(map(urlsafe_to_key, article_usafes))
+    # NOTE(cmiN): Some of them might get removed during pairing, for clean-up
+    #  reasons.
+    main_articles = ArticleModel.get_multi(article_keys)
+    missing_count = len(article_keys) - len(main_articles)
+    if missing_count:
+        logging.warning("Skipping %d already removed articles.", missing_count)
+    if not main_articles:
+        return {"bias_pairs": 0}
 
-    return {"bias_pairs": added_pairs}
+    return _pair_articles(main_articles)
@@ -30,10 +30,13 @@ class create_task:
 
     def __init__(self, queue):
         self._queue = queue
+        self._name = None  # of the decorated function
 
     @property
     def route(self):
-        return f"/task/{self._queue}"
+        # NOTE(cmiN): Multiple tasks can share the same queue, therefore the function
+        #  name tells them apart.
+        return f"/task/{self._queue}/{self._name}"
 
     @property
     def tasks_client(self):
@@ -97,6 +100,7 @@ class create_task:
         logging.debug("Created task %s.", response.name)
 
     def __call__(self, function):
+        self._name = function.__name__
         self._create_handler(function)
 
         def wrapper(*args, **kwargs):
@@ -17,7 +17,7 @@ require_headers = base.require_headers(
 @require_headers
 @as_json
 def cron_crawl_view():
-    """Spawns a new crawler for each individual target."""
+    """Spawns a new crawler for each target due to be crawled."""
     return {"crawled": crawl_articles()}
 
 
@@ -9,9 +9,10 @@ from truestory.models.article import BiasPairModel
 from truestory.views import base as views_base
 
 
-def _get_serializable_article(article_key):
+def _get_serializable_article(article_card, article_key):
     """JSON serializable article format used by the front-end ajax calls."""
-    article = article_key.get()
+    # Older pairs don't have the article details copied in.
+    article = article_card or article_key.get()
     # NOTE(cmiN): Sometimes even if the article was long removed, the pagination
     #  iterates through existing keys pointing to missing articles.
     if not article:
@@ -20,7 +21,8 @@ def _get_serializable_article(article_key):
     paragraph_split = lambda text: (
         "\n".join(views_base.paragraph_split_filter(text)) if text else ""
     )
-    details = article.to_dict()
+    details = article.to_dict(exclude=["article"])
+    details.setdefault("content", None)
     details.update({
         "usafe": url_for("article_view", article_usafe=article.urlsafe),
         "link": views_base.website_filter(details["link"]),
@@ -60,7 +62,9 @@ def home_view():
         pairs = []
         for pair in bias_pairs:
             left_dict, right_dict = map(
-                _get_serializable_article, (pair.left, pair.right)
+                _get_serializable_article,
+                (pair.left_card, pair.right_card),
+                (pair.left, pair.right)
             )
             pair = (left_dict, right_dict)
             if all(pair):